@@ -0,0 +1,105 @@
+"""
+CINEFLIX Scheduled Auto-Delete
+Removes delivered videos once their retention period is over
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from telegram.error import BadRequest, Forbidden
+
+from cleanup import DELETE_BATCH_SIZE
+from config import Config
+from database import db
+from governor import LOW_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+
+def auto_delete_delay(video: Dict) -> int:
+    """Seconds a delivered video stays in the chat, 0 = forever
+
+    Capped at AUTO_DELETE_MAX, later deletes would always be refused.
+    """
+    delay = video.get("auto_delete")
+    if delay is None:
+        delay = Config.AUTO_DELETE_AFTER
+    return min(max(0, int(delay)), Config.AUTO_DELETE_MAX)
+
+
+class AutoDeleteWorker:
+    """Polls the `scheduled_deletes` queue and deletes due messages
+
+    Entries live in Mongo, so deletions scheduled before a restart still
+    happen afterwards. Several bot instances can poll the same queue; each
+    entry is claimed by one of them and only marked done once Telegram has
+    answered, otherwise it is retried when its claim expires.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.bot = None
+        self.deleted = 0
+
+    def start(self, bot):
+        """Start polling"""
+        self.bot = bot
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop polling, unfinished claims are retried after their lease"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_once(self) -> int:
+        """Delete one batch of due entries, returns how many were claimed"""
+        entries = await db.claim_due_deletions(Config.AUTO_DELETE_BATCH_SIZE, Config.AUTO_DELETE_LEASE)
+        if not entries:
+            return 0
+
+        done = []
+        for entry in entries:
+            if await self._delete(entry["chat_id"], entry["message_ids"]):
+                done.append(entry["_id"])
+                self.deleted += len(entry["message_ids"])
+
+        if done:
+            await db.complete_deletions(done)
+        return len(entries)
+
+    async def _delete(self, chat_id: int, message_ids: List[int]) -> bool:
+        """Delete messages, False if the entry should be retried later"""
+        for i in range(0, len(message_ids), DELETE_BATCH_SIZE):
+            try:
+                await self.bot.delete_messages(
+                    chat_id=chat_id,
+                    message_ids=message_ids[i:i + DELETE_BATCH_SIZE],
+                    rate_limit_args=LOW_PRIORITY
+                )
+            except (BadRequest, Forbidden) as e:
+                # Already gone, too old or the user blocked the bot: retrying won't help
+                logger.debug(f"Could not auto-delete messages in {chat_id}: {e}")
+            except Exception as e:
+                logger.warning(f"Auto-delete in {chat_id} failed, will retry: {e}")
+                return False
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Auto-delete error: {e}")
+                claimed = 0
+
+            # A full batch means more are probably due right away
+            if claimed < Config.AUTO_DELETE_BATCH_SIZE:
+                await asyncio.sleep(Config.AUTO_DELETE_POLL_INTERVAL)
+
+
+# Create global auto-delete worker
+auto_deleter = AutoDeleteWorker()
@@ -0,0 +1,132 @@
+"""
+Fake Telegram Bot API server for offline benchmarks
+Answers the methods the bot uses with minimal valid payloads
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "CINEFLIX", "username": "cineflix_bench_bot"}
+
+
+class FakeBotAPI:
+    """Minimal HTTP/1.1 server speaking the Bot API over form-encoded POSTs
+
+    `latency` (seconds) is added to every call. `is_member` decides
+    getChatMember answers. Every copyMessage(s) call is timestamped per
+    target chat so the harness can measure delivery latency.
+    """
+
+    def __init__(self, latency: float = 0.0, is_member: Optional[Callable[[int, int], bool]] = None):
+        self.latency = latency
+        self.is_member = is_member or (lambda user_id, chat_id: True)
+        self.calls: Counter = Counter()
+        self.deliveries: Dict[int, List[float]] = defaultdict(list)
+        self._message_ids = itertools.count(1000)
+        self._server: Optional[asyncio.base_events.Server] = None
+        self.port: Optional[int] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode().split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                method = path.rstrip("/").rsplit("/", 1)[-1]
+                params = self._parse(body, headers.get("content-type", ""))
+
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                payload = json.dumps({"ok": True, "result": self._answer(method, params)}).encode()
+
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse(body: bytes, content_type: str) -> Dict:
+        if not body:
+            return {}
+        if "json" in content_type:
+            return json.loads(body)
+
+        params = {}
+        for key, value in parse_qsl(body.decode()):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    def _message(self, chat_id, text: str = None) -> Dict:
+        chat_type = "private" if int(chat_id) > 0 else "channel"
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": chat_type},
+            "from": BOT_USER
+        }
+        if text is not None:
+            message["text"] = text
+        return message
+
+    def _answer(self, method: str, params: Dict):
+        self.calls[method] += 1
+
+        if method == "getMe":
+            return {**BOT_USER, "can_join_groups": True, "can_read_all_group_messages": False,
+                    "supports_inline_queries": False}
+        if method == "getChatMember":
+            user_id, chat_id = int(params["user_id"]), int(params["chat_id"])
+            status = "member" if self.is_member(user_id, chat_id) else "left"
+            return {"status": status, "user": {"id": user_id, "is_bot": False, "first_name": "User"}}
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params["chat_id"], params.get("text", ""))
+        if method == "copyMessage":
+            self.deliveries[int(params["chat_id"])].append(time.perf_counter())
+            return {"message_id": next(self._message_ids)}
+        if method == "copyMessages":
+            self.deliveries[int(params["chat_id"])].append(time.perf_counter())
+            return [{"message_id": next(self._message_ids)} for _ in params["message_ids"]]
+        # deleteMessage(s), answerCallbackQuery, setWebhook, ...
+        return True
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
@@ -0,0 +1,102 @@
+"""
+In-memory Mongo stand-in for offline benchmarks
+Wraps mongomock-motor with injected latency and per-operation counters
+"""
+
+import asyncio
+from collections import Counter
+
+from mongomock_motor import AsyncMongoMockClient
+
+# Collection methods that would be a network round trip against real Mongo
+ASYNC_OPS = {
+    "find_one", "insert_one", "insert_many", "update_one", "update_many", "delete_one",
+    "delete_many", "find_one_and_update", "find_one_and_delete", "count_documents",
+    "estimated_document_count", "bulk_write", "create_index", "aggregate"
+}
+
+
+class OpStats:
+    """Shared latency setting and operation counters"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.ops: Counter = Counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.ops.values())
+
+    async def round_trip(self, name: str):
+        self.ops[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class _Cursor:
+    def __init__(self, cursor, stats: OpStats, name: str):
+        self._cursor = cursor
+        self._stats = stats
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._cursor, attr)
+        if attr in ("sort", "limit", "skip", "batch_size"):
+            return lambda *a, **k: _Cursor(value(*a, **k), self._stats, self._name)
+        return value
+
+    async def to_list(self, length=None):
+        await self._stats.round_trip(f"{self._name}.find")
+        return await self._cursor.to_list(length=length)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self._stats.round_trip(f"{self._name}.find")
+        async for document in self._cursor:
+            yield document
+
+
+class _Collection:
+    def __init__(self, collection, stats: OpStats):
+        self._collection = collection
+        self._stats = stats
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        if attr == "find":
+            return lambda *a, **k: _Cursor(value(*a, **k), self._stats, self._collection.name)
+        if attr in ASYNC_OPS:
+            async def op(*args, **kwargs):
+                await self._stats.round_trip(f"{self._collection.name}.{attr}")
+                return await value(*args, **kwargs)
+            return op
+        return value
+
+
+class _Database:
+    def __init__(self, database, stats: OpStats):
+        self._database = database
+        self._stats = stats
+
+    def __getitem__(self, name):
+        return _Collection(self._database[name], self._stats)
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+class FakeMongoClient:
+    """Drop-in for AsyncIOMotorClient backed by mongomock"""
+
+    def __init__(self, stats: OpStats):
+        self._client = AsyncMongoMockClient()
+        self._stats = stats
+        self.admin = self._client.admin
+
+    def __getitem__(self, name):
+        return _Database(self._client[name], self._stats)
+
+    def close(self):
+        pass
@@ -0,0 +1,280 @@
+"""
+CINEFLIX Offline Benchmark
+Drives the real handlers against a fake Bot API and an in-memory Mongo
+
+    python -m bench.run --users 500 --requests 2000 --bot-latency 40 --mongo-latency 5
+
+Reports deep-link latency percentiles, updates/sec, Mongo ops per update
+and Bot API calls per update.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from bench.fake_bot_api import FakeBotAPI
+from bench.fake_mongo import FakeMongoClient, OpStats
+
+ADMIN_ID = 999999999
+STORAGE_CHANNEL = -1009999999999
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def user(user_id: int) -> Dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+
+def command_update(update_id: int, user_id: int, text: str) -> Dict:
+    command = text.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user(user_id),
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        }
+    }
+
+
+def verify_update(update_id: int, user_id: int, short_code: str) -> Dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user(user_id),
+            "chat_instance": str(user_id),
+            "data": f"verify_{short_code}",
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "🔒 Content Locked!"
+            }
+        }
+    }
+
+
+def channel_post_update(update_id: int, message_id: int) -> Dict:
+    return {
+        "update_id": update_id,
+        "channel_post": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": STORAGE_CHANNEL, "type": "channel", "title": "Storage"},
+            "video": {
+                "file_id": f"file{message_id}",
+                "file_unique_id": f"unique{message_id}",
+                "width": 1280,
+                "height": 720,
+                "duration": 60,
+                "file_name": f"Movie {message_id}.mp4"
+            }
+        }
+    }
+
+
+def configure(args, api: FakeBotAPI, stats: OpStats):
+    """Point the bot at the fakes before bot modules are imported"""
+    import database
+    from config import Config
+
+    database.AsyncIOMotorClient = lambda *a, **k: FakeMongoClient(stats)
+
+    Config.BOT_TOKEN = "123456:bench"
+    Config.MONGO_URI = "mongodb://bench"
+    Config.BOT_API_BASE_URL = api.base_url
+    Config.ADMIN_ID = ADMIN_ID
+    Config.VIDEO_LOAD_DELAY = args.load_delay
+    Config.ENABLE_ANTI_SPAM = False
+    if args.unthrottled:
+        Config.GOVERNOR_GLOBAL_RATE = 1e6
+        Config.GOVERNOR_PRIVATE_CHAT_RATE = 1e6
+        Config.GOVERNOR_GROUP_CHAT_RATE = 1e6
+        Config.GOVERNOR_CHAT_BURST = 1e6
+
+
+async def run(args) -> Dict:
+    random.seed(args.seed)
+    stats = OpStats(args.mongo_latency / 1000)
+    not_joined = set(random.sample(range(1, args.users + 1), int(args.users * args.not_joined / 100)))
+    api = FakeBotAPI(args.bot_latency / 1000, is_member=lambda uid, chat_id: uid not in not_joined)
+    await api.start()
+    configure(args, api, stats)
+
+    import bot
+    from broadcast import broadcaster
+    from database import db
+
+    application = bot.build_application()
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    # Seed channels and a catalogue of videos
+    for i in range(1, args.channels):
+        await db.add_channel(f"@bench{i}", -1000000000000 - i, f"Bench {i}")
+    codes = []
+    for i in range(args.videos):
+        code = await db.generate_short_code("VID")
+        await db.add_video(message_id=i + 1, short_code=code, title=f"Video {i}", channel_id=STORAGE_CHANNEL)
+        codes.append(code)
+    for uid in range(1, args.users + 1):
+        await db.add_user(uid, None, f"User{uid}")
+    await db.write_buffer.flush()
+
+    # Zipf-like popularity: a few codes get most of the traffic
+    weights = [1 / (rank + 1) for rank in range(len(codes))]
+    updates, sent_at = [], {}
+    update_ids = iter(range(1, 10 ** 9))
+    for _ in range(args.requests):
+        uid = random.randint(1, args.users)
+        code = random.choices(codes, weights)[0]
+        update_id = next(update_ids)
+        if uid in not_joined and random.random() < 0.5:
+            updates.append(("verify", uid, verify_update(update_id, uid, code)))
+        else:
+            updates.append(("deeplink", uid, command_update(update_id, uid, f"/start {code}")))
+    for i in range(args.channel_posts):
+        updates.append(("post", None, channel_post_update(next(update_ids), 100000 + i)))
+    random.shuffle(updates)
+
+    api.calls.clear()
+    stats.ops.clear()
+    for key in list(api.deliveries):
+        del api.deliveries[key]
+
+    from telegram import Update
+
+    expected = {}
+    started = time.perf_counter()
+    interval = 1 / args.rate if args.rate else 0
+    for kind, uid, data in updates:
+        if kind == "deeplink" and uid not in not_joined:
+            sent_at.setdefault(uid, []).append(time.perf_counter())
+            expected[uid] = expected.get(uid, 0) + 1
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        if interval:
+            await asyncio.sleep(interval)
+
+    deadline = time.perf_counter() + args.timeout
+    while time.perf_counter() < deadline:
+        delivered = all(len(api.deliveries.get(uid, ())) >= n for uid, n in expected.items())
+        if delivered and application.update_queue.empty():
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await db.write_buffer.flush()
+
+    latencies = []
+    for uid, starts in sent_at.items():
+        for start, done in zip(starts, api.deliveries.get(uid, ())):
+            latencies.append((done - start) * 1000)
+
+    processed_updates = len(updates)
+    result = {
+        "updates": processed_updates,
+        "deep_links_measured": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(processed_updates / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "mean": round(statistics.mean(latencies), 1) if latencies else 0.0
+        },
+        "mongo_ops_per_update": round(stats.total / processed_updates, 2),
+        "bot_api_calls_per_update": round(api.total_calls / processed_updates, 2),
+        "bot_api_calls": dict(api.calls.most_common()),
+        "mongo_ops": dict(stats.ops.most_common())
+    }
+
+    if args.broadcast:
+        api.calls.clear()
+        started = time.perf_counter()
+        await application.update_queue.put(
+            Update.de_json(command_update(next(update_ids), ADMIN_ID, "/broadcast bench"), application.bot)
+        )
+        await asyncio.sleep(0.1)
+        while broadcaster.running and time.perf_counter() - started < args.timeout:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        result["broadcast"] = {
+            "recipients": args.users,
+            "elapsed_s": round(elapsed, 3),
+            "messages_per_s": round(api.calls["sendMessage"] / elapsed, 1)
+        }
+
+    # Same order as run_polling/run_webhook
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+    await api.stop()
+    return result
+
+
+def print_report(result: Dict, args):
+    latency = result["latency_ms"]
+    print("=" * 60)
+    print("CINEFLIX offline benchmark")
+    print(f"bot latency {args.bot_latency} ms | mongo latency {args.mongo_latency} ms | "
+          f"{args.channels} channels | {args.users} users")
+    print("=" * 60)
+    print(f"Updates processed      : {result['updates']} in {result['elapsed_s']} s")
+    print(f"Updates/sec            : {result['updates_per_s']}")
+    print(f"Deep-link latency (ms) : p50 {latency['p50']} | p95 {latency['p95']} | "
+          f"p99 {latency['p99']} | mean {latency['mean']} (n={result['deep_links_measured']})")
+    print(f"Mongo ops / update     : {result['mongo_ops_per_update']}")
+    print(f"Bot API calls / update : {result['bot_api_calls_per_update']}")
+    print(f"Bot API calls          : {result['bot_api_calls']}")
+    print(f"Mongo ops              : {result['mongo_ops']}")
+    if "broadcast" in result:
+        b = result["broadcast"]
+        print(f"Broadcast              : {b['recipients']} users in {b['elapsed_s']} s "
+              f"({b['messages_per_s']} msg/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline CINEFLIX bot benchmark")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=1000, help="deep links + verify taps")
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--channels", type=int, default=4, help="force-join channels")
+    parser.add_argument("--channel-posts", type=int, default=20)
+    parser.add_argument("--not-joined", type=float, default=10, help="percent of users not joined")
+    parser.add_argument("--bot-latency", type=float, default=40, help="ms per Bot API call")
+    parser.add_argument("--mongo-latency", type=float, default=5, help="ms per Mongo round trip")
+    parser.add_argument("--load-delay", type=float, default=0, help="VIDEO_LOAD_DELAY override (s)")
+    parser.add_argument("--rate", type=float, default=0, help="updates/sec to inject (0 = burst)")
+    parser.add_argument("--unthrottled", action="store_true", help="lift governor limits")
+    parser.add_argument("--broadcast", action="store_true", help="also time a broadcast")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run(args))
+    print_report(result, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,33 @@ Premium Streaming Bot with Deep Link Support
 
 import logging
 import asyncio
-from datetime import datetime
+import re
+import time
 from typing import Dict
 
+from pymongo.errors import DuplicateKeyError
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import (
     Application, CommandHandler, ContextTypes,
     MessageHandler, CallbackQueryHandler, filters
 )
+from telegram.helpers import escape_markdown
 
 from config import Config, Messages, Buttons
 from database import db
+from cache import TTLCache
+from ratelimit import SpamLimiter, LocalLimiterBackend, MongoLimiterBackend
+from broadcast import broadcaster
+from cleanup import cleanup_worker, DELETE_BATCH_SIZE
+from autodelete import auto_deleter, auto_delete_delay
+from notify import upload_notifier
+from updates import PerUserUpdateProcessor
+from governor import TelegramGovernor, LOW_PRIORITY, SCRATCH
+from metrics import (
+    HANDLER_LATENCY, SPAM_REJECTIONS, FORCE_JOIN_BLOCKS, COPY_FAILURES,
+    MetricsServer, timed, track_cache, track_queue, track_spam_limiter
+)
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -23,7 +39,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-user_last_request = {}
+spam_limiter = SpamLimiter(
+    policy=Config.ANTI_SPAM_POLICY,
+    cooldown=Config.ANTI_SPAM_COOLDOWN,
+    max_requests=Config.ANTI_SPAM_MAX_REQUESTS,
+    window=Config.ANTI_SPAM_WINDOW,
+    max_keys=Config.ANTI_SPAM_MAX_USERS
+)
+spam_backend = LocalLimiterBackend(spam_limiter)
+if Config.RATE_LIMIT_BACKEND == "mongo":
+    spam_backend = MongoLimiterBackend(
+        lambda: db.rate_limits, spam_backend, Config.SHARED_LIMITER_TIMEOUT
+    )
+track_spam_limiter(spam_limiter, spam_backend)
+
+# (user_id, chat_id) -> bool, positives live for minutes, negatives for seconds
+membership_cache = TTLCache(Config.MEMBERSHIP_CACHE_SIZE, Config.MEMBERSHIP_POSITIVE_TTL)
+track_cache("membership", membership_cache)
+
+metrics_server = MetricsServer(Config.METRICS_LISTEN, Config.METRICS_PORT)
 
 # ===================== HELPER FUNCTIONS =====================
 
@@ -32,31 +66,47 @@ async def check_spam(user_id: int) -> bool:
     if not Config.ENABLE_ANTI_SPAM:
         return False
     
-    current_time = datetime.now()
-    if user_id in user_last_request:
-        time_diff = (current_time - user_last_request[user_id]).total_seconds()
-        if time_diff < Config.ANTI_SPAM_COOLDOWN:
-            return True
-    
-    user_last_request[user_id] = current_time
+    if await spam_backend.hit(user_id):
+        SPAM_REJECTIONS.inc()
+        return True
     return False
 
-async def is_user_member(context: ContextTypes.DEFAULT_TYPE, user_id: int, channel_id: int) -> bool:
-    """Check if user is member of a channel"""
+async def is_user_member(context: ContextTypes.DEFAULT_TYPE, user_id: int, channel_id: int,
+                         fresh: bool = False) -> bool:
+    """Check if user is member of a channel (cached)
+    
+    With fresh=True a cached "not joined" answer is ignored, so a user who
+    just joined and taps verify is re-checked immediately.
+    """
+    cache_key = (user_id, channel_id)
+    cached = membership_cache.get(cache_key)
+    if cached is not None and (cached or not fresh):
+        return cached
+    
     try:
         member = await context.bot.get_chat_member(channel_id, user_id)
-        return member.status in ['member', 'administrator', 'creator']
+        is_member = member.status in ['member', 'administrator', 'creator']
     except Exception as e:
         logger.error(f"Error checking membership: {e}")
         return False
+    
+    ttl = Config.MEMBERSHIP_POSITIVE_TTL if is_member else Config.MEMBERSHIP_NEGATIVE_TTL
+    membership_cache.set(cache_key, is_member, ttl)
+    return is_member
 
-async def check_all_channels(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> Dict:
-    """Check membership of all required channels"""
+async def check_all_channels(context: ContextTypes.DEFAULT_TYPE, user_id: int, fresh: bool = False) -> Dict:
+    """Check membership of all required channels concurrently (results keep the channel order)"""
     channels = await db.get_all_channels()
     results = {"all_joined": True, "channels": []}
+    semaphore = asyncio.Semaphore(max(1, Config.MEMBERSHIP_CHECK_CONCURRENCY))
     
-    for channel in channels:
-        is_member = await is_user_member(context, user_id, channel["chat_id"])
+    async def check(channel):
+        async with semaphore:
+            return await is_user_member(context, user_id, channel["chat_id"], fresh=fresh)
+    
+    memberships = await asyncio.gather(*(check(channel) for channel in channels))
+    
+    for channel, is_member in zip(channels, memberships):
         results["channels"].append({
             "username": channel["username"],
             "name": channel.get("name", channel["username"]),
@@ -68,22 +118,52 @@ async def check_all_channels(context: ContextTypes.DEFAULT_TYPE, user_id: int) -
     return results
 
 async def cleanup_old_messages(context: ContextTypes.DEFAULT_TYPE, user_id: int):
-    """Clean up old bot messages"""
+    """Hand old bot messages to the background cleanup worker"""
     if not Config.ENABLE_AUTO_CLEANUP:
         return
     
     try:
-        old_message_ids = await db.get_user_messages(user_id)
-        for msg_id in old_message_ids[:Config.MAX_CLEANUP_MESSAGES]:
-            try:
-                await context.bot.delete_message(chat_id=user_id, message_id=msg_id)
-                await asyncio.sleep(0.05)
-            except Exception as e:
-                logger.debug(f"Could not delete message {msg_id}: {e}")
-        await db.clear_user_messages(user_id)
+        old_message_ids = await db.take_user_messages(user_id)
+        await cleanup_worker.submit(user_id, old_message_ids)
     except Exception as e:
         logger.error(f"Cleanup error: {e}")
 
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_duration(text):
+    """Parse "90", "30m", "2h" or "1d" into seconds, None if invalid"""
+    match = re.fullmatch(r"(\d+)([smhd]?)", text.lower())
+    if not match:
+        return None
+    return int(match.group(1)) * DURATION_UNITS[match.group(2) or "s"]
+
+def format_duration(seconds):
+    """Render seconds as e.g. 2h 30m"""
+    parts = []
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60), ("s", 1)):
+        if seconds >= size:
+            parts.append(f"{seconds // size}{unit}")
+            seconds %= size
+    return " ".join(parts) or "0s"
+
+async def save_with_new_code(prefix, save):
+    """Call save(short_code) with fresh codes until one is not taken
+    
+    Returns the code that was saved, or None.
+    """
+    for _ in range(Config.SHORT_CODE_MAX_ATTEMPTS):
+        try:
+            short_code = await db.generate_short_code(prefix)
+        except Exception as e:
+            logger.error(f"Error generating short code: {e}")
+            return None
+        
+        try:
+            return short_code if await save(short_code) else None
+        except DuplicateKeyError:
+            logger.warning(f"Short code {short_code} already taken, trying another")
+    return None
+
 def format_channels_list(channels, with_status=False):
     """Format channel list for display"""
     if not channels:
@@ -102,6 +182,7 @@ def format_channels_list(channels, with_status=False):
 
 # ===================== START COMMAND =====================
 
+@timed(HANDLER_LATENCY)
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command with deep link support"""
     user = update.effective_user
@@ -115,8 +196,11 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Add/update user in database
-    await db.add_user(user_id, user.username, user.first_name)
+    # Add/update user in database, off the reply path
+    context.application.create_task(
+        db.add_user(user_id, user.username, user.first_name),
+        update=update
+    )
     
     # Check if video request from deep link (short code)
     if context.args and len(context.args) > 0:
@@ -156,20 +240,23 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ===================== VIDEO REQUEST HANDLER WITH SHORT CODE =====================
 
+@timed(HANDLER_LATENCY)
 async def handle_video_request(update: Update, context: ContextTypes.DEFAULT_TYPE, short_code: str):
     """Handle video watch request using short code"""
     user = update.effective_user
     user_id = user.id
     chat_id = update.effective_chat.id
     
-    # Anti-spam check
+    # Anti-spam check (ban status was checked by start_command)
     if await check_spam(user_id):
         return
     
-    # Check if user is banned
-    if await db.is_user_banned(user_id):
-        await update.message.reply_text("🚫 You are banned.")
-        return
+    # A cached code resolves at once, so membership is only checked for a
+    # known video. On a cache miss the check overlaps the query and is never
+    # cancelled, so its answers are cached even if the code is unknown.
+    membership_task = None
+    if not db.video_cached(short_code):
+        membership_task = asyncio.ensure_future(check_all_channels(context, user_id))
     
     # Get video from database by short code
     video = await db.get_video_by_code(short_code)
@@ -181,10 +268,11 @@ async def handle_video_request(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return
     
-    # Check channel membership
-    membership = await check_all_channels(context, user_id)
+    membership = await (membership_task or check_all_channels(context, user_id))
     
     if not membership["all_joined"]:
+        FORCE_JOIN_BLOCKS.inc(source="deep_link")
+        
         # Show force join message
         channels_status = format_channels_list(membership["channels"], with_status=True)
         
@@ -216,66 +304,150 @@ async def handle_video_request(update: Update, context: ContextTypes.DEFAULT_TYP
     await send_video_to_user(update, context, video, user_id, chat_id)
 
 async def send_video_to_user(update, context, video, user_id, chat_id):
-    """Send video file to user"""
+    """Show loading message and schedule the video delivery
+    
+    The loading delay runs in the job queue, so the handler returns
+    immediately and never holds up other updates.
+    """
     try:
-        # Show loading message
-        loading_msg = await update.message.reply_text(Messages.LOADING_VIDEO)
-        
-        # Smooth UX delay
-        await asyncio.sleep(Config.VIDEO_LOAD_DELAY)
-        
-        # Cleanup old messages (force join messages etc)
-        await cleanup_old_messages(context, user_id)
-        
-        # Delete loading message
-        try:
-            await loading_msg.delete()
-        except:
-            pass
-        
+        loading_msg = await context.bot.send_message(chat_id=chat_id, text=Messages.LOADING_VIDEO)
+    except Exception as e:
+        logger.error(f"Error sending loading message: {e}")
+        return
+    
+    data = {
+        "video": video,
+        "user_id": user_id,
+        "chat_id": chat_id,
+        "loading_message_id": loading_msg.message_id
+    }
+    
+    if context.job_queue:
+        context.job_queue.run_once(
+            deliver_video_job,
+            Config.VIDEO_LOAD_DELAY,
+            data=data,
+            chat_id=chat_id,
+            user_id=user_id
+        )
+    else:
+        async def delayed():
+            await asyncio.sleep(Config.VIDEO_LOAD_DELAY)
+            await deliver_video(context, **data)
+        context.application.create_task(delayed())
+
+async def deliver_video_job(context: ContextTypes.DEFAULT_TYPE):
+    """Job queue callback for scheduled deliveries"""
+    await deliver_video(context, **context.job.data)
+
+def group_copy_batches(items, batch_size):
+    """Split series items into copy_messages batches
+    
+    Each batch comes from one source channel with strictly increasing
+    message ids (a Bot API requirement), so episode order is preserved.
+    """
+    batches = []
+    for item in items:
+        channel_id = item.get("channel_id") or Config.DEFAULT_CHANNELS[0]["chat_id"]
+        last = batches[-1] if batches else None
+        if (last and last[0] == channel_id and len(last[1]) < batch_size
+                and item["message_id"] > last[1][-1]):
+            last[1].append(item["message_id"])
+        else:
+            batches.append((channel_id, [item["message_id"]]))
+    return batches
+
+async def copy_video_messages(context, video, chat_id):
+    """Copy a video or series into chat, returns the new message IDs"""
+    if not video.get("items"):
         # Get channel ID from video or use default
         source_channel_id = video.get("channel_id") or Config.DEFAULT_CHANNELS[0]["chat_id"]
-        message_id = video["message_id"]
-        
-        # Send video from channel
         try:
             video_msg = await context.bot.copy_message(
                 chat_id=chat_id,
                 from_chat_id=source_channel_id,
-                message_id=message_id,
+                message_id=video["message_id"],
                 protect_content=Config.ENABLE_DOWNLOAD_PROTECTION
             )
+            return [video_msg.message_id]
         except Exception as e:
+            COPY_FAILURES.inc(method="copy_message")
             logger.error(f"Video send error: {e}")
-            await update.message.reply_text(Messages.VIDEO_NOT_FOUND, parse_mode='Markdown')
+            return []
+    
+    sent_ids = []
+    for source_channel_id, message_ids in group_copy_batches(video["items"], Config.COPY_BATCH_SIZE):
+        try:
+            copied = await context.bot.copy_messages(
+                chat_id=chat_id,
+                from_chat_id=source_channel_id,
+                message_ids=message_ids,
+                protect_content=Config.ENABLE_DOWNLOAD_PROTECTION
+            )
+            sent_ids.extend(m.message_id for m in copied)
+        except Exception as e:
+            COPY_FAILURES.inc(method="copy_messages")
+            logger.error(f"Series batch send error ({video['short_code']}): {e}")
+    return sent_ids
+
+@timed(HANDLER_LATENCY)
+async def deliver_video(context, video, user_id, chat_id, loading_message_id):
+    """Send video file to user"""
+    try:
+        # Cleanup old messages (force join messages etc) and delete loading message
+        await asyncio.gather(
+            cleanup_old_messages(context, user_id),
+            context.bot.delete_message(chat_id=chat_id, message_id=loading_message_id),
+            return_exceptions=True
+        )
+        
+        # Send video (or every episode of a series) from channel
+        sent_ids = await copy_video_messages(context, video, chat_id)
+        if not sent_ids:
+            await context.bot.send_message(chat_id=chat_id, text=Messages.VIDEO_NOT_FOUND, parse_mode='Markdown')
             return
         
         # Success message with back button
         keyboard = [[InlineKeyboardButton(Buttons.BACK_TO_APP, web_app={"url": Config.MINI_APP_URL})]]
         
-        success_msg = await update.message.reply_text(
-            Messages.VIDEO_READY,
+        delete_after = auto_delete_delay(video)
+        ready_text = Messages.VIDEO_READY
+        if delete_after:
+            ready_text += Messages.AUTO_DELETE_NOTICE.format(duration=format_duration(delete_after))
+        
+        success_msg = await context.bot.send_message(
+            chat_id=chat_id,
+            text=ready_text,
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
         )
         
         # Save messages for future cleanup
-        await db.save_user_messages(user_id, [video_msg.message_id, success_msg.message_id])
+        delivered_ids = sent_ids + [success_msg.message_id]
+        await db.save_user_messages(user_id, delivered_ids)
+        if delete_after:
+            await db.schedule_deletion(chat_id, delivered_ids, delete_after)
         
-        # Update watch count
+        # Update watch count and analytics
         await db.increment_watch_count(user_id)
+        await db.record_watch(video, user_id)
         
         logger.info(f"✅ Video {video['short_code']} sent to user {user_id}")
         
     except Exception as e:
         logger.error(f"Error sending video: {e}")
-        await update.message.reply_text(
-            "❌ Something went wrong. Please try again.",
-            parse_mode='Markdown'
-        )
+        try:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text="❌ Something went wrong. Please try again.",
+                parse_mode='Markdown'
+            )
+        except Exception:
+            pass
 
 # ===================== CALLBACK HANDLER =====================
 
+@timed(HANDLER_LATENCY)
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle button callbacks"""
     query = update.callback_query
@@ -298,14 +470,13 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data.startswith("verify_"):
         short_code = data.replace("verify_", "")
         
-        # Show verifying message
-        await query.message.edit_text(Messages.VERIFYING, parse_mode='Markdown')
-        
-        # Small delay
-        await asyncio.sleep(1)
-        
-        # Check membership again
-        membership = await check_all_channels(context, user_id)
+        # Show verifying message while membership (skipping cached "not joined"
+        # results) and the video are checked
+        _, membership, video = await asyncio.gather(
+            query.message.edit_text(Messages.VERIFYING, parse_mode='Markdown'),
+            check_all_channels(context, user_id, fresh=True),
+            db.get_video_by_code(short_code)
+        )
         
         if membership["all_joined"]:
             # Delete verification message
@@ -314,9 +485,6 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             except:
                 pass
             
-            # Get video
-            video = await db.get_video_by_code(short_code)
-            
             if video:
                 # Send video
                 await send_video_to_user(update, context, video, user_id, query.message.chat_id)
@@ -328,6 +496,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
         else:
             # Still not joined
+            FORCE_JOIN_BLOCKS.inc(source="verify")
             channels_status = format_channels_list(membership["channels"], with_status=True)
             
             keyboard = []
@@ -352,6 +521,16 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ===================== CHANNEL POST HANDLER WITH AUTO SHORT CODE =====================
 
+def video_title(message, default: str = "Untitled") -> str:
+    """Title for a stored video: file name, else caption, else default"""
+    title = message.caption or default
+    if message.video:
+        title = message.video.file_name or title
+    elif message.document:
+        title = message.document.file_name or title
+    return title
+
+@timed(HANDLER_LATENCY)
 async def channel_post_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new posts in channels - auto generate short code"""
     try:
@@ -360,62 +539,299 @@ async def channel_post_handler(update: Update, context: ContextTypes.DEFAULT_TYP
             return
         
         # Get video title from caption or filename
-        title = message.caption or "Untitled"
-        if message.video:
-            title = message.video.file_name or title
-        elif message.document:
-            title = message.document.file_name or title
+        title = video_title(message)
         
-        # Auto-generate short code
-        short_code = await db.generate_short_code("VID")
-        
-        # Save to database
-        await db.add_video(
+        # Auto-generate short code and save to database
+        short_code = await save_with_new_code("VID", lambda code: db.add_video(
             message_id=message.message_id,
-            short_code=short_code,
+            short_code=code,
             title=title,
             channel_id=message.chat_id
-        )
+        ))
+        if not short_code:
+            logger.error(f"❌ Could not save video {message.message_id} from {message.chat_id}")
+            return
         
         logger.info(f"✅ New video saved: {short_code} -> {title}")
         
-        # Send notification to admin with short code
-        try:
-            bot_username = (await context.bot.get_me()).username
-            deep_link = f"https://t.me/{bot_username}?start={short_code}"
-            
-            admin_msg = f"""📹 **New Video Added!**
-
-📌 **Title:** {title}
-
-🔐 **Short Code:** `{short_code}`
+        # Notify admin, bulk uploads are grouped into digests
+        await upload_notifier.add(context.bot, {
+            "short_code": short_code,
+            "title": title,
+            "message_id": message.message_id,
+            "channel": message.chat.title or "Channel"
+        })
+        
+    except Exception as e:
+        logger.error(f"Channel post handler error: {e}")
 
-🆔 **Message ID:** `{message.message_id}`
+# ===================== ADMIN COMMANDS =====================
 
-📢 **Channel:** {message.chat.title or "Channel"}
+def parse_series_args(args, max_items):
+    """Split /series arguments into short codes (ranges expanded) and a title
+    
+    Raises ValueError once more than max_items codes are requested, before
+    expanding any range that would cross the limit.
+    """
+    codes, title_words = [], []
+    for arg in args:
+        match = re.fullmatch(r"([A-Za-z0-9_]*[A-Za-z_])(\d+)(?:-(?:[A-Za-z0-9_]*[A-Za-z_])?(\d+))?", arg)
+        if not match or title_words:
+            title_words.append(arg)
+            continue
+        
+        prefix, start, end = match.group(1).upper(), match.group(2), match.group(3)
+        count = 1 if end is None else max(0, int(end) - int(start) + 1)
+        if len(codes) + count > max_items:
+            raise ValueError(f"more than {max_items} videos")
+        
+        if end is None:
+            codes.append(f"{prefix}{start}")
+        else:
+            width = len(start)
+            for number in range(int(start), int(end) + 1):
+                codes.append(f"{prefix}{number:0{width}d}")
+    return codes, ' '.join(title_words)
 
-🔗 **Deep Link:**
-`{deep_link}`
+@timed(HANDLER_LATENCY)
+async def series_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Create a series code that delivers several videos at once"""
+    if update.effective_user.id != Config.ADMIN_ID:
+        return
+    
+    try:
+        codes, title = parse_series_args(context.args or [], Config.MAX_SERIES_ITEMS)
+    except ValueError:
+        await update.message.reply_text(f"❌ Max {Config.MAX_SERIES_ITEMS} videos per series")
+        return
+    
+    if not codes:
+        await update.message.reply_text(
+            "**Usage:** `/series VID0001-VID0020 [title]`\n"
+            "or `/series VID0001 VID0005 VID0009 [title]`",
+            parse_mode='Markdown'
+        )
+        return
+    
+    videos = await db.get_videos_by_codes(codes)
+    missing = [code for code in codes if code not in videos]
+    if missing:
+        await update.message.reply_text(
+            f"❌ Not found: `{', '.join(missing[:20])}`",
+            parse_mode='Markdown'
+        )
+        return
+    
+    # Series codes contribute all of their episodes
+    items = []
+    for code in codes:
+        video = videos[code]
+        items.extend(video.get("items") or [
+            {"channel_id": video.get("channel_id"), "message_id": video["message_id"]}
+        ])
+    if len(items) > Config.MAX_SERIES_ITEMS:
+        await update.message.reply_text(f"❌ Max {Config.MAX_SERIES_ITEMS} videos per series")
+        return
+    
+    title = title or f"{codes[0]} - {codes[-1]}"
+    short_code = await save_with_new_code("SER", lambda code: db.add_series(code, title, items))
+    
+    if not short_code:
+        await update.message.reply_text("❌ Failed to create series", parse_mode='Markdown')
+        return
+    
+    deep_link = f"https://t.me/{context.bot.username}?start={short_code}"
+    await update.message.reply_text(
+        f"📚 **Series Created!**\n\n"
+        f"📌 **Title:** {escape_markdown(title)}\n"
+        f"🎬 **Episodes:** {len(items)}\n"
+        f"🔐 **Short Code:** `{short_code}`\n\n"
+        f"🔗 **Deep Link:**\n`{deep_link}`",
+        parse_mode='Markdown'
+    )
 
-✅ Video saved! Use the short code in your mini app.
-Users will click and watch directly!
+@timed(HANDLER_LATENCY)
+async def backfill_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Index a range of existing storage channel posts"""
+    if update.effective_user.id != Config.ADMIN_ID:
+        return
+    
+    args = context.args or []
+    try:
+        channel_id, first_id, last_id = (int(arg) for arg in args[:3])
+    except ValueError:
+        await update.message.reply_text(
+            "**Usage:** `/backfill chat_id first_id last_id [title]`\n"
+            "Indexes the videos in the range that are not indexed yet; "
+            "`title` is used for videos without a file name or caption",
+            parse_mode='Markdown'
+        )
+        return
+    
+    if first_id < 1 or last_id < first_id or last_id - first_id + 1 > Config.BACKFILL_MAX_RANGE:
+        await update.message.reply_text(f"❌ Give a range of 1-{Config.BACKFILL_MAX_RANGE} message IDs")
+        return
+    
+    title_prefix = ' '.join(args[3:]) or None
+    status_msg = await update.message.reply_text("📥 **Backfill started...**", parse_mode='Markdown')
+    
+    # Runs in the background so the admin's other commands are not blocked
+    context.application.create_task(
+        run_backfill(context, status_msg, channel_id, first_id, last_id, title_prefix),
+        update=update
+    )
 
-**Mini App Link Format:**
-t.me/{bot_username}?start={short_code}"""
-            
-            await context.bot.send_message(
-                chat_id=Config.ADMIN_ID,
-                text=admin_msg,
-                parse_mode='Markdown'
+async def inspect_channel_posts(context, channel_id: int, message_ids) -> Dict:
+    """Find which channel posts are videos
+    
+    The Bot API cannot read a channel's history, so every post is forwarded
+    to the scratch chat once and the copies are deleted again. Deleted IDs
+    and service messages can't be forwarded and count as not videos.
+    Returns {"videos": {message_id: message}, "others": n, "failed": n}.
+    """
+    scratch_chat_id = Config.BACKFILL_SCRATCH_CHAT_ID or Config.ADMIN_ID
+    semaphore = asyncio.Semaphore(max(1, Config.BACKFILL_CONCURRENCY))
+    result = {"videos": {}, "others": 0, "failed": 0}
+    copies = []
+    
+    async def inspect(message_id):
+        async with semaphore:
+            try:
+                message = await context.bot.forward_message(
+                    chat_id=scratch_chat_id,
+                    from_chat_id=channel_id,
+                    message_id=message_id,
+                    disable_notification=True,
+                    rate_limit_args=SCRATCH
+                )
+            except BadRequest as e:
+                logger.debug(f"Backfill skips {channel_id}/{message_id}: {e}")
+                result["others"] += 1
+                return
+            except Exception as e:
+                logger.warning(f"Backfill could not inspect {channel_id}/{message_id}: {e}")
+                result["failed"] += 1
+                return
+        
+        copies.append(message.message_id)
+        if message.video or message.document:
+            result["videos"][message_id] = message
+        else:
+            result["others"] += 1
+    
+    await asyncio.gather(*(inspect(message_id) for message_id in message_ids))
+    
+    for i in range(0, len(copies), DELETE_BATCH_SIZE):
+        try:
+            await context.bot.delete_messages(
+                chat_id=scratch_chat_id,
+                message_ids=copies[i:i + DELETE_BATCH_SIZE],
+                rate_limit_args=LOW_PRIORITY
             )
         except Exception as e:
-            logger.error(f"Failed to notify admin: {e}")
+            logger.warning(f"Could not delete backfill copies in {scratch_chat_id}: {e}")
+    
+    return result
+
+async def run_backfill(context, status_msg, channel_id, first_id, last_id, title_prefix):
+    """Import the range chunk by chunk and keep the admin posted"""
+    total = last_id - first_id + 1
+    imported, skipped, others, first_code, last_code = 0, 0, 0, None, None
+    started = last_report = time.monotonic()
+    
+    for chunk_start in range(first_id, last_id + 1, Config.BACKFILL_CHUNK_SIZE):
+        chunk = list(range(chunk_start, min(chunk_start + Config.BACKFILL_CHUNK_SIZE, last_id + 1)))
+        indexed = await db.get_indexed_message_ids(channel_id, chunk)
+        if indexed is None:
+            continue
+        skipped += len(indexed)
         
+        posts = await inspect_channel_posts(context, channel_id, [m for m in chunk if m not in indexed])
+        others += posts["others"]
+        titles = {
+            message_id: video_title(message, f"{title_prefix} {message_id}" if title_prefix else "Untitled")
+            for message_id, message in sorted(posts["videos"].items())
+        }
+        videos = await db.import_videos(channel_id, titles)
+        imported += len(videos)
+        if videos:
+            first_code = first_code or videos[0]["short_code"]
+            last_code = videos[-1]["short_code"]
+        
+        if time.monotonic() - last_report >= Config.BACKFILL_PROGRESS_INTERVAL:
+            last_report = time.monotonic()
+            try:
+                await status_msg.edit_text(
+                    f"📥 **Backfilling...**\n\n"
+                    f"📊 Progress: {chunk[-1] - first_id + 1}/{total}\n"
+                    f"✔️ Imported: {imported}\n"
+                    f"🚫 Not videos: {others}",
+                    parse_mode='Markdown'
+                )
+            except Exception:
+                pass
+    
+    elapsed = time.monotonic() - started
+    failed = total - imported - skipped - others
+    text = (
+        f"✅ **Backfill Complete!**\n\n"
+        f"✔️ Imported: {imported}\n"
+        f"⏭️ Already indexed: {skipped}\n"
+        f"🚫 Not videos: {others}\n"
+        f"❌ Failed: {failed}\n"
+        f"⏱️ Time: {elapsed:.1f}s ({imported / max(elapsed, 0.001):.0f} videos/s)"
+    )
+    if first_code:
+        text += f"\n🔐 Codes: `{first_code}` - `{last_code}`"
+    try:
+        await status_msg.edit_text(text, parse_mode='Markdown')
     except Exception as e:
-        logger.error(f"Channel post handler error: {e}")
+        logger.error(f"Could not post backfill report: {e}")
+    logger.info(
+        f"📥 Backfill of {channel_id} done: {imported} imported, {skipped} already indexed, "
+        f"{others} not videos in {elapsed:.1f}s"
+    )
 
-# ===================== ADMIN COMMANDS =====================
+@timed(HANDLER_LATENCY)
+async def autodelete_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Set how long a delivered video stays in the user's chat"""
+    if update.effective_user.id != Config.ADMIN_ID:
+        return
+    
+    if not context.args or len(context.args) < 2:
+        default = format_duration(Config.AUTO_DELETE_AFTER) if Config.AUTO_DELETE_AFTER else "off"
+        await update.message.reply_text(
+            "**Usage:** `/autodelete VID0001 30m`\n"
+            "`off` keeps the video, `default` uses the global setting "
+            f"(currently {default})",
+            parse_mode='Markdown'
+        )
+        return
+    
+    short_code, value = context.args[0].upper(), context.args[1].lower()
+    if value == "default":
+        seconds = None
+    elif value == "off":
+        seconds = 0
+    else:
+        seconds = parse_duration(value)
+        if not seconds or seconds > Config.AUTO_DELETE_MAX:
+            await update.message.reply_text("❌ Use a duration between 1s and 48h (e.g. 90, 30m, 2h)")
+            return
+    
+    if not await db.set_video_auto_delete(short_code, seconds):
+        await update.message.reply_text(f"❌ `{short_code}` not found", parse_mode='Markdown')
+        return
+    
+    if seconds is None:
+        text = f"✅ `{short_code}` now uses the global auto-delete setting"
+    elif seconds == 0:
+        text = f"✅ `{short_code}` will not be auto-deleted"
+    else:
+        text = f"✅ `{short_code}` will be deleted {format_duration(seconds)} after delivery"
+    await update.message.reply_text(text, parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show bot statistics"""
     if update.effective_user.id != Config.ADMIN_ID:
@@ -425,18 +841,53 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     stats_text = f"""📊 **CINEFLIX Bot Statistics**
 
-👥 Total Users: {stats.get('total_users', 0)}
-🎬 Total Videos: {stats.get('total_videos', 0)}
+👥 Total Users: ~{stats.get('total_users', 0)}
+🔥 Active Today: {stats.get('daily_active_users', 0)}
+🎬 Total Videos: ~{stats.get('total_videos', 0)}
 📢 Active Channels: {stats.get('total_channels', 0)}
 🚫 Banned Users: {stats.get('banned_users', 0)}
 
 🤖 Status: ✅ Running
 🌐 Mini App: Active
 ⚡ Database: Connected
-🔗 Short Code System: Active"""
+🔗 Short Code System: Active
+🕒 Updated: {int(stats.get('snapshot_age', 0))}s ago"""
     
     await update.message.reply_text(stats_text, parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
+async def topvideos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show most watched videos from the pre-aggregated counters"""
+    if update.effective_user.id != Config.ADMIN_ID:
+        return
+    
+    try:
+        limit = min(int(context.args[0]), 50) if context.args else 10
+    except ValueError:
+        limit = 10
+    
+    top = await db.get_top_videos(limit)
+    
+    if not top.get("today"):
+        await update.message.reply_text("No views recorded today")
+        return
+    
+    def render(rows):
+        lines = []
+        for i, row in enumerate(rows, 1):
+            info = top["videos"].get(row["short_code"], {})
+            lines.append(
+                f"{i}. `{row['short_code']}` - {row['count']} views "
+                f"({info.get('total', row['count'])} total)"
+            )
+        return "\n".join(lines) or "No views yet"
+    
+    text = f"🔥 **Top Videos Today:**\n\n{render(top['today'])}\n\n"
+    text += f"⏰ **This Hour:**\n\n{render(top['this_hour'])}"
+    
+    await update.message.reply_text(text, parse_mode='Markdown')
+
+@timed(HANDLER_LATENCY)
 async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Broadcast message to all users"""
     if update.effective_user.id != Config.ADMIN_ID:
@@ -449,33 +900,31 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    message = ' '.join(context.args)
-    user_ids = await db.get_all_user_ids()
+    if broadcaster.running:
+        await update.message.reply_text(
+            "⚠️ A broadcast is already running.\nUse /cancelbroadcast to stop it.",
+            parse_mode='Markdown'
+        )
+        return
     
-    success = 0
-    failed = 0
+    message = ' '.join(context.args)
+    job = await broadcaster.start(context.bot, message, update.effective_chat.id)
     
-    status_msg = await update.message.reply_text("📤 Broadcasting...")
+    if not job:
+        await update.message.reply_text("❌ Failed to start broadcast", parse_mode='Markdown')
+
+@timed(HANDLER_LATENCY)
+async def cancelbroadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Cancel the running broadcast"""
+    if update.effective_user.id != Config.ADMIN_ID:
+        return
     
-    for uid in user_ids:
-        try:
-            await context.bot.send_message(
-                chat_id=uid,
-                text=f"📢 **Broadcast:**\n\n{message}",
-                parse_mode='Markdown'
-            )
-            success += 1
-            await asyncio.sleep(0.05)
-        except:
-            failed += 1
-    
-    await status_msg.edit_text(
-        f"✅ **Broadcast Complete!**\n\n"
-        f"✔️ Sent: {success}\n"
-        f"❌ Failed: {failed}",
-        parse_mode='Markdown'
-    )
+    if await broadcaster.cancel():
+        await update.message.reply_text("🛑 Broadcast cancelled!", parse_mode='Markdown')
+    else:
+        await update.message.reply_text("No broadcast running", parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
 async def addchannel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Add a new channel"""
     if update.effective_user.id != Config.ADMIN_ID:
@@ -504,6 +953,7 @@ async def addchannel_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     else:
         await update.message.reply_text("❌ Failed to add channel", parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
 async def removechannel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Remove a channel"""
     if update.effective_user.id != Config.ADMIN_ID:
@@ -521,6 +971,7 @@ async def removechannel_command(update: Update, context: ContextTypes.DEFAULT_TY
     else:
         await update.message.reply_text("❌ Channel not found", parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
 async def listchannels_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all channels"""
     if update.effective_user.id != Config.ADMIN_ID:
@@ -540,6 +991,7 @@ async def listchannels_command(update: Update, context: ContextTypes.DEFAULT_TYP
     
     await update.message.reply_text(text, parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
 async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Ban a user"""
     if update.effective_user.id != Config.ADMIN_ID:
@@ -564,6 +1016,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text("❌ Failed to ban user", parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
 async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Unban a user"""
     if update.effective_user.id != Config.ADMIN_ID:
@@ -586,6 +1039,7 @@ async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text("❌ User not found in ban list", parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
 async def banlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show banned users list"""
     if update.effective_user.id != Config.ADMIN_ID:
@@ -604,6 +1058,7 @@ async def banlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(text, parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show help message"""
     user_id = update.effective_user.id
@@ -615,6 +1070,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(help_text, parse_mode='Markdown')
 
+@timed(HANDLER_LATENCY)
 async def getid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get chat and user IDs"""
     if update.effective_user.id != Config.ADMIN_ID:
@@ -637,18 +1093,58 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ===================== MAIN APPLICATION =====================
 
-def main():
-    """Main function to run the bot"""
-    logger.info("🚀 Starting CINEFLIX Bot with Short Code System...")
-    
-    # Create application
-    application = Application.builder().token(Config.BOT_TOKEN).build()
+async def post_init(application: Application):
+    """Database initialization and background workers"""
+    connected = await db.connect()
+    if not connected:
+        logger.error("❌ Failed to connect to MongoDB!")
+        logger.error("⚠️ Bot will continue but database features won't work.")
+    else:
+        logger.info("✅ Database connected successfully!")
+        broadcaster.watch(application.bot)
+        auto_deleter.start(application.bot)
+    cleanup_worker.start(application.bot)
+    
+    track_queue("updates", application.update_queue.qsize)
+    if isinstance(application.update_processor, PerUserUpdateProcessor):
+        track_queue("updates_in_progress", lambda: application.update_processor.pending)
+    track_queue("cleanup", lambda: cleanup_worker.queue_size)
+    track_queue("write_behind", lambda: db.write_buffer.pending)
+    if Config.METRICS_PORT:
+        await metrics_server.start()
+
+async def post_stop(application: Application):
+    """Stop background workers while the bot can still make API calls"""
+    await metrics_server.stop()
+    await broadcaster.stop()
+    await auto_deleter.stop()
+    await upload_notifier.stop()
+    await cleanup_worker.stop()
+
+async def post_shutdown(application: Application):
+    """Flush pending writes and close the database"""
+    await db.close()
+
+def build_application() -> Application:
+    """Create the application with all handlers registered"""
+    builder = Application.builder().token(Config.BOT_TOKEN).rate_limiter(TelegramGovernor())
+    if Config.BOT_API_BASE_URL:
+        base_url = Config.BOT_API_BASE_URL.rstrip('/')
+        builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+    if Config.CONCURRENT_UPDATES > 1:
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(Config.CONCURRENT_UPDATES))
+    application = builder.post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown).build()
     
     # Command handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("topvideos", topvideos_command))
+    application.add_handler(CommandHandler("series", series_command))
+    application.add_handler(CommandHandler("autodelete", autodelete_command))
+    application.add_handler(CommandHandler("backfill", backfill_command))
     application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("cancelbroadcast", cancelbroadcast_command))
     application.add_handler(CommandHandler("addchannel", addchannel_command))
     application.add_handler(CommandHandler("removechannel", removechannel_command))
     application.add_handler(CommandHandler("listchannels", listchannels_command))
@@ -669,23 +1165,46 @@ def main():
     # Error handler
     application.add_error_handler(error_handler)
     
-    # Database initialization
-    async def post_init(application: Application):
-        connected = await db.connect()
-        if not connected:
-            logger.error("❌ Failed to connect to MongoDB!")
-            logger.error("⚠️ Bot will continue but database features won't work.")
-        else:
-            logger.info("✅ Database connected successfully!")
+    return application
+
+def main():
+    """Main function to run the bot"""
+    logger.info("🚀 Starting CINEFLIX Bot with Short Code System...")
     
-    application.post_init = post_init
+    if Config.AUTO_DELETE_AFTER > Config.AUTO_DELETE_MAX:
+        logger.warning(
+            f"⚠️ AUTO_DELETE_AFTER={Config.AUTO_DELETE_AFTER} is over the 48h Telegram allows "
+            f"for deletes, using {Config.AUTO_DELETE_MAX}"
+        )
+    
+    application = build_application()
     
     logger.info("✅ CINEFLIX Bot is running!")
     logger.info("🔗 Short Code System: Active")
     logger.info("📡 Listening for updates...")
     
     # Run bot
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if Config.BOT_MODE == "webhook":
+        if not Config.WEBHOOK_URL:
+            logger.error("❌ WEBHOOK_URL must be set when BOT_MODE=webhook!")
+            return
+        if not Config.WEBHOOK_SECRET:
+            # Without it anyone who finds the URL can post forged updates
+            logger.error("❌ WEBHOOK_SECRET must be set when BOT_MODE=webhook!")
+            return
+        
+        logger.info(f"🌐 Webhook mode on {Config.WEBHOOK_LISTEN}:{Config.WEBHOOK_PORT}/{Config.WEBHOOK_PATH}")
+        application.run_webhook(
+            listen=Config.WEBHOOK_LISTEN,
+            port=Config.WEBHOOK_PORT,
+            url_path=Config.WEBHOOK_PATH,
+            webhook_url=f"{Config.WEBHOOK_URL.rstrip('/')}/{Config.WEBHOOK_PATH}",
+            secret_token=Config.WEBHOOK_SECRET,
+            max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()
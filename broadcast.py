@@ -0,0 +1,207 @@
+"""
+CINEFLIX Broadcast Engine
+Rate-governed, concurrent broadcasts that resume after a restart
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from bson import ObjectId
+from telegram.error import Forbidden
+
+from config import Config
+from database import db
+from governor import LOW_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+
+PROGRESS_HEADERS = {
+    "running": "📤 **Broadcasting...**",
+    "done": "✅ **Broadcast Complete!**",
+    "failed": "❌ **Broadcast Failed!**"
+}
+
+
+def format_progress(job: Dict, status: str = "running") -> str:
+    """Render the admin progress message for a broadcast job"""
+    done = job["sent"] + job["blocked"] + job["failed"]
+    header = PROGRESS_HEADERS[status]
+
+    return (
+        f"{header}\n\n"
+        f"✔️ Sent: {job['sent']}\n"
+        f"🚫 Blocked: {job['blocked']}\n"
+        f"❌ Failed: {job['failed']}\n"
+        f"📊 Progress: {done}/{job['total']}"
+    )
+
+
+class BroadcastManager:
+    """Runs broadcast jobs stored in the `broadcasts` collection
+
+    Every job is leased to one process (`owner`), so replicas never send
+    the same job twice; jobs whose lease ran out are picked up by `watch`.
+    """
+
+    def __init__(self):
+        self.owner = ObjectId()
+        self._tasks: Dict = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, bot, text: str, admin_chat_id: int) -> Optional[Dict]:
+        """Create a job, post its progress message and start sending"""
+        total = await db.get_total_users()
+        job = await db.create_broadcast(text, admin_chat_id, total, self.owner, Config.BROADCAST_LEASE)
+        if not job:
+            return None
+
+        try:
+            status_msg = await bot.send_message(
+                chat_id=admin_chat_id,
+                text=format_progress(job),
+                parse_mode='Markdown'
+            )
+            job["status_message_id"] = status_msg.message_id
+            await db.update_broadcast(job["_id"], {"status_message_id": status_msg.message_id})
+        except Exception as e:
+            logger.error(f"Could not post broadcast progress: {e}")
+
+        self._spawn(bot, job)
+        return job
+
+    def watch(self, bot):
+        """Resume unclaimed jobs now and whenever a lease runs out"""
+        if not self._watcher:
+            self._watcher = asyncio.create_task(self._watch(bot))
+
+    async def resume_pending(self, bot):
+        """Claim and resume jobs left running by a stopped or dead process"""
+        while True:
+            job = await db.claim_broadcast(self.owner, Config.BROADCAST_LEASE)
+            if not job:
+                return
+            if job["_id"] not in self._tasks:
+                logger.info(f"🔁 Resuming broadcast {job['_id']} after user {job.get('cursor')}")
+                self._spawn(bot, job)
+
+    async def cancel(self) -> bool:
+        """Cancel every running job"""
+        if not self._tasks:
+            return False
+
+        for job_id, task in list(self._tasks.items()):
+            await db.update_broadcast(job_id, {"status": "cancelled"})
+            task.cancel()
+        return True
+
+    async def stop(self):
+        """Stop workers on shutdown; jobs stay `running` and are released
+        so the next process resumes them without waiting for the lease"""
+        if self._watcher:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+        jobs = list(self._tasks.items())
+        for _, task in jobs:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in jobs), return_exceptions=True)
+        for job_id, _ in jobs:
+            await db.update_broadcast(job_id, {"lease_until": None}, owner=self.owner)
+
+    def _spawn(self, bot, job: Dict):
+        task = asyncio.create_task(self._run(bot, job))
+        self._tasks[job["_id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["_id"], None))
+
+    async def _run(self, bot, job: Dict):
+        semaphore = asyncio.Semaphore(Config.BROADCAST_CONCURRENCY)
+        text = f"📢 **Broadcast:**\n\n{job['text']}"
+        cursor = job.get("cursor")
+        last_progress = time.monotonic()
+
+        async def send(uid):
+            async with semaphore:
+                return await self._send(bot, uid, text)
+
+        try:
+            async for user_ids in db.iter_user_ids(Config.BROADCAST_BATCH_SIZE, start_after=cursor):
+                outcomes = await asyncio.gather(*(send(uid) for uid in user_ids))
+                counts = {key: outcomes.count(key) for key in ("sent", "blocked", "failed")}
+                for key, value in counts.items():
+                    job[key] += value
+
+                cursor = user_ids[-1]
+                if not await db.update_broadcast(job["_id"], {"cursor": cursor, "lease_until": self._lease()},
+                                                 counts, owner=self.owner):
+                    logger.warning(f"Broadcast {job['_id']} was cancelled or taken over, stopping")
+                    return
+
+                if time.monotonic() - last_progress >= Config.BROADCAST_PROGRESS_INTERVAL:
+                    await self._edit_progress(bot, job)
+                    last_progress = time.monotonic()
+
+            await db.update_broadcast(job["_id"], {"status": "done", "finished_at": datetime.now()})
+            await self._edit_progress(bot, job, "done")
+            logger.info(f"✅ Broadcast {job['_id']} finished: {job['sent']} sent")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Broadcast {job['_id']} crashed at user {cursor}: {e}")
+            await db.update_broadcast(
+                job["_id"], {"status": "failed", "error": str(e), "finished_at": datetime.now()}, owner=self.owner
+            )
+            await self._edit_progress(bot, job, "failed")
+
+    async def _watch(self, bot):
+        while True:
+            try:
+                await self.resume_pending(bot)
+            except Exception as e:
+                logger.error(f"Broadcast resume error: {e}")
+            await asyncio.sleep(Config.BROADCAST_RESUME_INTERVAL)
+
+    def _lease(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=Config.BROADCAST_LEASE)
+
+    async def _send(self, bot, user_id: int, text: str) -> str:
+        """Send one broadcast message; pacing and RetryAfter are the governor's job"""
+        try:
+            await bot.send_message(
+                chat_id=user_id,
+                text=text,
+                parse_mode='Markdown',
+                rate_limit_args=LOW_PRIORITY
+            )
+            return "sent"
+        except Forbidden:
+            return "blocked"
+        except Exception as e:
+            logger.debug(f"Broadcast to {user_id} failed: {e}")
+            return "failed"
+
+    async def _edit_progress(self, bot, job: Dict, status: str = "running"):
+        if not job.get("status_message_id"):
+            return
+        try:
+            await bot.edit_message_text(
+                chat_id=job["admin_chat_id"],
+                message_id=job["status_message_id"],
+                text=format_progress(job, status),
+                parse_mode='Markdown',
+                rate_limit_args=LOW_PRIORITY
+            )
+        except Exception as e:
+            logger.debug(f"Could not edit broadcast progress: {e}")
+
+
+# Create global broadcast manager
+broadcaster = BroadcastManager()
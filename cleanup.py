@@ -0,0 +1,92 @@
+"""
+CINEFLIX Message Cleanup Worker
+Deletes old bot messages in the background, batched per chat
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Set
+
+from config import Config
+from governor import LOW_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+# Bot API limit for deleteMessages
+DELETE_BATCH_SIZE = 100
+
+
+class CleanupWorker:
+    """Bounded queue of chats whose old messages should be deleted
+
+    Repeated requests for the same chat are merged into the pending entry,
+    and submit() waits while the queue is full so producers slow down
+    instead of piling up work.
+    """
+
+    def __init__(self, max_queue: int, workers: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._pending: Dict[int, Set[int]] = {}
+        self._num_workers = workers
+        self._workers: List[asyncio.Task] = []
+        self.bot = None
+
+    def start(self, bot):
+        """Start worker tasks"""
+        self.bot = bot
+        for _ in range(self._num_workers):
+            self._workers.append(asyncio.create_task(self._work()))
+
+    async def stop(self, timeout: float = 5):
+        """Give queued deletions a moment to finish, then stop workers"""
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Cleanup stopped with {self._queue.qsize()} chats pending")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, chat_id: int, message_ids: Iterable[int]):
+        """Queue message_ids in chat_id for deletion"""
+        message_ids = set(message_ids)
+        if not message_ids:
+            return
+
+        if chat_id in self._pending:
+            self._pending[chat_id].update(message_ids)
+            return
+
+        self._pending[chat_id] = message_ids
+        await self._queue.put(chat_id)
+
+    async def _work(self):
+        while True:
+            chat_id = await self._queue.get()
+            try:
+                message_ids = sorted(self._pending.pop(chat_id, ()))
+                for i in range(0, len(message_ids), DELETE_BATCH_SIZE):
+                    await self._delete(chat_id, message_ids[i:i + DELETE_BATCH_SIZE])
+            finally:
+                self._queue.task_done()
+
+    async def _delete(self, chat_id: int, message_ids: List[int]):
+        try:
+            await self.bot.delete_messages(
+                chat_id=chat_id,
+                message_ids=message_ids,
+                rate_limit_args=LOW_PRIORITY
+            )
+        except Exception as e:
+            logger.debug(f"Could not delete messages {message_ids} in {chat_id}: {e}")
+
+
+# Create global cleanup worker
+cleanup_worker = CleanupWorker(Config.CLEANUP_QUEUE_SIZE, Config.CLEANUP_WORKERS)
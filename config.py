@@ -25,13 +25,107 @@ class Config:
         }
     ]
     
+    # Serving Mode: "polling" (default) or "webhook"
+    BOT_MODE = os.environ.get("BOT_MODE", "polling").lower()
+    WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+    WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+    WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.environ.get("PORT", "8443"))
+    WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+    WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "40"))
+    
+    # Prometheus-style metrics endpoint (0 disables)
+    METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+    METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "0.0.0.0")
+    
+    # Custom Bot API server (e.g. a local fake for testing)
+    BOT_API_BASE_URL = os.environ.get("BOT_API_BASE_URL", "")
+    
     # Mini App
     MINI_APP_URL = os.environ.get("MINI_APP_URL", "https://cinaflix-streaming.vercel.app/")
     
     # Performance
     VIDEO_LOAD_DELAY = 4
+    CONCURRENT_UPDATES = 64
+    COPY_BATCH_SIZE = 100
+    MAX_SERIES_ITEMS = 200
     ANTI_SPAM_COOLDOWN = 5
-    MAX_CLEANUP_MESSAGES = 50
+    ANTI_SPAM_POLICY = "cooldown"  # cooldown / sliding_window / token_bucket
+    ANTI_SPAM_MAX_REQUESTS = 3
+    ANTI_SPAM_WINDOW = 15
+    ANTI_SPAM_MAX_USERS = 100000
+    RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "local")  # local / mongo
+    SHARED_LIMITER_TIMEOUT = 0.15
+    MAX_CLEANUP_MESSAGES = 250  # tracked per user, enough for a full series
+    CLEANUP_QUEUE_SIZE = 1000
+    CLEANUP_WORKERS = 2
+    
+    # Scheduled Auto-Delete of delivered videos (seconds, 0 = keep forever)
+    # Bots can only delete messages younger than 48 hours; a video's
+    # "auto_delete" field overrides the global value
+    AUTO_DELETE_AFTER = int(os.environ.get("AUTO_DELETE_AFTER", "0"))
+    AUTO_DELETE_MAX = 48 * 3600
+    AUTO_DELETE_POLL_INTERVAL = 10
+    AUTO_DELETE_BATCH_SIZE = 200
+    AUTO_DELETE_LEASE = 120
+    AUTO_DELETE_DONE_RETENTION = 86400
+    
+    # Membership Cache (seconds)
+    MEMBERSHIP_CACHE_SIZE = 50000
+    MEMBERSHIP_POSITIVE_TTL = 300
+    MEMBERSHIP_NEGATIVE_TTL = 10
+    MEMBERSHIP_CHECK_CONCURRENCY = 5
+    
+    # Video Cache (seconds)
+    VIDEO_CACHE_SIZE = 5000
+    VIDEO_CACHE_TTL = 600
+    VIDEO_NEGATIVE_TTL = 30
+    
+    # Short Codes reserved per counter round trip
+    SHORT_CODE_BLOCK_SIZE = 10
+    SHORT_CODE_MAX_ATTEMPTS = 3
+    
+    # Admin Upload Notifications (seconds)
+    UPLOAD_NOTIFY_WINDOW = 10
+    UPLOAD_DIGEST_MAX_ITEMS = 25
+    
+    # Channel Backfill (/backfill)
+    # Posts are forwarded to the scratch chat to see which are videos and
+    # deleted again; 0 = the admin's chat
+    BACKFILL_SCRATCH_CHAT_ID = int(os.environ.get("BACKFILL_SCRATCH_CHAT_ID", "0"))
+    BACKFILL_CONCURRENCY = 20
+    BACKFILL_CHUNK_SIZE = 1000
+    BACKFILL_MAX_RANGE = 100000
+    BACKFILL_PROGRESS_INTERVAL = 5
+    
+    # Outbound Bot API Governor (requests per second)
+    GOVERNOR_GLOBAL_RATE = 30
+    GOVERNOR_LOW_PRIORITY_RESERVE = 5
+    GOVERNOR_PRIVATE_CHAT_RATE = 1
+    GOVERNOR_GROUP_CHAT_RATE = 0.33
+    GOVERNOR_CHAT_BURST = 5
+    GOVERNOR_MAX_CHATS = 100000
+    GOVERNOR_MAX_RETRIES = 3
+    
+    # Broadcast
+    BROADCAST_CONCURRENCY = 20
+    BROADCAST_BATCH_SIZE = 500
+    BROADCAST_PROGRESS_INTERVAL = 15
+    BROADCAST_LEASE = 300
+    BROADCAST_RESUME_INTERVAL = 60
+    
+    # Write-Behind (user upserts and watch counters)
+    WRITE_BEHIND_INTERVAL_MS = 500
+    WRITE_BEHIND_MAX_OPS = 500
+    WRITE_BEHIND_MAX_PENDING = 10000
+    
+    # Analytics
+    WATCH_EVENT_RETENTION_DAYS = 30
+    
+    # Registry Sync (seconds, 0 = disabled)
+    CHANNEL_REFRESH_INTERVAL = 60
+    BAN_SYNC_INTERVAL = 60
+    STATS_REFRESH_INTERVAL = 300
     
     # Features
     ENABLE_AUTO_CLEANUP = True
@@ -74,6 +168,8 @@ Hello **{user_name}**! 👋
     
     VIDEO_READY = "✅ **Enjoy Watching!** 🍿\n\nআরো content দেখতে App এ ফিরে যান!"
     
+    AUTO_DELETE_NOTICE = "\n\n⏳ This video will be deleted in **{duration}**."
+    
     VIDEO_NOT_FOUND = """❌ **Video Not Found!**
 
 এই video টি হয়তো remove করা হয়েছে বা link ভুল আছে।
@@ -91,9 +187,16 @@ Hello **{user_name}**! 👋
 /unban user_id - Unban user
 /banlist - Banned users
 
+**Video Management:**
+/series VID0001-VID0020 [title] - Create series link
+/backfill chat_id first_id last_id [title] - Import old posts
+/autodelete VID0001 30m|off|default - Auto-delete timer
+
 **Statistics:**
 /stats - Bot stats
+/topvideos [count] - Most watched today
 /broadcast message - Send to all
+/cancelbroadcast - Stop running broadcast
 
 **Other:**
 /getid - Get IDs
@@ -3,14 +3,29 @@ CINEFLIX Database Operations with Short Code System
 MongoDB async operations using Motor
 """
 
+import asyncio
 import logging
-from datetime import datetime
-from typing import List, Dict, Optional
+import re
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Dict, Optional, Set
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from config import Config
+from cache import TTLCache
+from writebehind import WriteBehindBuffer
+from metrics import DB_LATENCY, timed_methods, track_cache, track_write_buffer
 
 logger = logging.getLogger(__name__)
 
+_NOT_FOUND = object()
+
+def format_short_code(prefix: str, number: int) -> str:
+    """Short code for a reserved number, e.g. VID0042"""
+    return f"{prefix}{number:04d}"
+
+@timed_methods(DB_LATENCY)
 class Database:
     """Database handler for CINEFLIX bot with short code support"""
     
@@ -18,6 +33,38 @@ class Database:
         self.client = None
         self.db = None
         
+        # In-process channel registry, None until (re)loaded
+        self._channels: Optional[List[Dict]] = None
+        
+        # In-process ban set, kept in sync by ban/unban
+        self._banned_ids: Set[int] = set()
+        # user_id -> banned, for ban/unban calls made while a refresh is loading
+        self._ban_changes: Optional[Dict[int, bool]] = None
+        
+        # short_code -> video document (or _NOT_FOUND for unknown codes)
+        self._video_cache = TTLCache(Config.VIDEO_CACHE_SIZE, Config.VIDEO_CACHE_TTL)
+        
+        # Per-prefix blocks of pre-reserved short code numbers: prefix -> [next, last]
+        self._code_blocks: Dict[str, List[int]] = {}
+        self._code_lock = asyncio.Lock()
+        self._seeded_prefixes: Set[str] = set()
+        
+        # Background /stats snapshot
+        self._stats: Dict = {}
+        self._stats_at: Optional[datetime] = None
+        
+        # Coalesced user upserts and counters, flushed with bulk_write
+        self.write_buffer = WriteBehindBuffer(
+            Config.WRITE_BEHIND_INTERVAL_MS / 1000,
+            Config.WRITE_BEHIND_MAX_OPS,
+            Config.WRITE_BEHIND_MAX_PENDING
+        )
+        
+        self._tasks: List[asyncio.Task] = []
+        
+        track_cache("video", self._video_cache)
+        track_write_buffer(self.write_buffer)
+        
     async def connect(self):
         """Connect to MongoDB database"""
         try:
@@ -42,18 +89,49 @@ class Database:
             self.channels = self.db.channels
             self.banned_users = self.db.banned_users
             self.user_messages = self.db.user_messages
+            self.counters = self.db.counters
+            self.broadcasts = self.db.broadcasts
+            self.rate_limits = self.db.rate_limits
+            self.watch_events = self.db.watch_events
+            self.video_counters = self.db.video_counters
+            self.video_hourly = self.db.video_hourly
+            self.video_daily = self.db.video_daily
+            self.scheduled_deletes = self.db.scheduled_deletes
             
             # Create indexes
             await self.users.create_index("user_id", unique=True)
+            await self.users.create_index("last_active")
             await self.videos.create_index("short_code", unique=True)
             await self.videos.create_index("message_id")
             await self.channels.create_index("username", unique=True)
             await self.user_messages.create_index("user_id", unique=True)
             await self.banned_users.create_index("user_id", unique=True)
+            await self.broadcasts.create_index([("status", 1), ("lease_until", 1)])
+            await self.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+            await self.watch_events.create_index(
+                "ts", expireAfterSeconds=Config.WATCH_EVENT_RETENTION_DAYS * 86400
+            )
+            await self.watch_events.create_index([("hour", 1), ("short_code", 1)])
+            await self.video_hourly.create_index([("hour", 1), ("short_code", 1)], unique=True)
+            await self.video_hourly.create_index([("hour", 1), ("count", -1)])
+            await self.video_daily.create_index([("day", 1), ("short_code", 1)], unique=True)
+            await self.video_daily.create_index([("day", 1), ("count", -1)])
+            await self.scheduled_deletes.create_index([("status", 1), ("due_at", 1)])
+            await self.scheduled_deletes.create_index(
+                "done_at", expireAfterSeconds=Config.AUTO_DELETE_DONE_RETENTION
+            )
             
             # Initialize default channels
             await self.initialize_defaults()
             
+            # Warm in-process registries
+            await self.refresh_channels()
+            await self.refresh_banned_users()
+            self._start_periodic(Config.CHANNEL_REFRESH_INTERVAL, self.refresh_channels)
+            self._start_periodic(Config.BAN_SYNC_INTERVAL, self.refresh_banned_users)
+            self._start_periodic(Config.STATS_REFRESH_INTERVAL, self.refresh_stats)
+            self.write_buffer.start()
+            
             logger.info("✅ Database initialized successfully!")
             return True
             
@@ -61,6 +139,34 @@ class Database:
             logger.error(f"❌ Database connection error: {e}")
             return False
     
+    async def close(self):
+        """Stop background tasks and close the connection"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        
+        # Flush buffered writes before the connection goes away
+        await self.write_buffer.stop()
+        
+        if self.client:
+            self.client.close()
+    
+    def _start_periodic(self, interval: float, func):
+        """Run func every interval seconds in the background"""
+        if not interval or interval <= 0:
+            return
+        
+        async def loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await func()
+                except Exception as e:
+                    logger.error(f"Periodic task {func.__name__} failed: {e}")
+        
+        self._tasks.append(asyncio.create_task(loop()))
+    
     async def initialize_defaults(self):
         """Initialize default channels from config"""
         try:
@@ -79,20 +185,19 @@ class Database:
     # ===================== USER OPERATIONS =====================
     
     async def add_user(self, user_id: int, username: str = None, first_name: str = None):
-        """Add or update user in database"""
+        """Add or update user in database (write-behind)"""
         try:
-            await self.users.update_one(
+            await self.write_buffer.update(
+                self.users,
                 {"user_id": user_id},
-                {
-                    "$set": {
-                        "username": username,
-                        "first_name": first_name,
-                        "last_active": datetime.now()
-                    },
-                    "$setOnInsert": {
-                        "join_date": datetime.now(),
-                        "total_videos_watched": 0
-                    }
+                set={
+                    "username": username,
+                    "first_name": first_name,
+                    "last_active": datetime.now()
+                },
+                set_on_insert={
+                    "join_date": datetime.now(),
+                    "total_videos_watched": 0
                 },
                 upsert=True
             )
@@ -109,17 +214,40 @@ class Database:
     async def get_all_user_ids(self) -> List[int]:
         """Get all user IDs"""
         try:
-            users = await self.users.find({}, {"user_id": 1}).to_list(length=None)
+            users = await self.users.find({}, {"user_id": 1, "_id": 0}).to_list(length=None)
             return [u["user_id"] for u in users]
         except:
             return []
     
+    async def iter_user_ids(self, batch_size: int = 1000,
+                            start_after: int = None) -> AsyncIterator[List[int]]:
+        """Stream user IDs in user_id order, one batch at a time
+        
+        Uses keyset pagination on the user_id index, so memory stays constant
+        and a caller can resume from the last user_id it processed. Database
+        errors propagate so an interrupted caller can resume later.
+        """
+        cursor = start_after
+        while True:
+            query = {} if cursor is None else {"user_id": {"$gt": cursor}}
+            users = await self.users.find(
+                query, {"user_id": 1, "_id": 0}
+            ).sort("user_id", 1).limit(batch_size).to_list(length=batch_size)
+            batch = [u["user_id"] for u in users]
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            cursor = batch[-1]
+    
     async def increment_watch_count(self, user_id: int):
-        """Increment user's video watch count"""
+        """Increment user's video watch count (write-behind)"""
         try:
-            await self.users.update_one(
+            await self.write_buffer.update(
+                self.users,
                 {"user_id": user_id},
-                {"$inc": {"total_videos_watched": 1}}
+                inc={"total_videos_watched": 1}
             )
         except:
             pass
@@ -127,35 +255,149 @@ class Database:
     # ===================== VIDEO OPERATIONS WITH SHORT CODE =====================
     
     async def add_video(self, message_id: int, short_code: str, title: str = None, channel_id: int = None):
-        """Add video to database with short code"""
+        """Add video to database with short code
+        
+        Raises DuplicateKeyError if the code is already taken, so the caller
+        can retry with a fresh code instead of overwriting another video.
+        """
         try:
-            await self.videos.update_one(
-                {"short_code": short_code},
-                {
-                    "$set": {
-                        "message_id": message_id,
-                        "short_code": short_code,
-                        "title": title,
-                        "channel_id": channel_id,
-                        "added_date": datetime.now()
-                    }
-                },
-                upsert=True
-            )
+            await self.videos.insert_one({
+                "message_id": message_id,
+                "short_code": short_code,
+                "title": title,
+                "channel_id": channel_id,
+                "added_date": datetime.now()
+            })
+            self._video_cache.pop(short_code.upper())
             logger.info(f"✅ Video saved: {short_code} -> Message ID: {message_id}")
             return True
+        except DuplicateKeyError:
+            raise
         except Exception as e:
             logger.error(f"Error adding video: {e}")
             return False
     
+    async def get_indexed_message_ids(self, channel_id: int, message_ids: List[int]) -> Optional[Set[int]]:
+        """Which of the channel's message IDs are already indexed as videos, None on error"""
+        try:
+            existing = await self.videos.find(
+                {"message_id": {"$in": message_ids}, "channel_id": channel_id, "items": {"$exists": False}},
+                {"message_id": 1, "_id": 0}
+            ).to_list(length=None)
+        except Exception as e:
+            logger.error(f"Error checking indexed messages: {e}")
+            return None
+        return {v["message_id"] for v in existing}
+    
+    async def import_videos(self, channel_id: int, titles: Dict[int, str]) -> List[Dict]:
+        """Index existing channel videos with one code reservation and one bulk_write
+        
+        `titles` maps message IDs, already checked to be videos, to titles.
+        Returns the inserted video documents.
+        """
+        if not titles:
+            return []
+        try:
+            now = datetime.now()
+            numbers = await self.reserve_code_numbers(len(titles), "VID")
+            videos = [
+                {
+                    "message_id": message_id,
+                    "short_code": format_short_code("VID", number),
+                    "title": title,
+                    "channel_id": channel_id,
+                    "added_date": now
+                }
+                for (message_id, title), number in zip(titles.items(), numbers)
+            ]
+        except Exception as e:
+            logger.error(f"Error preparing video import: {e}")
+            return []
+        
+        try:
+            await self.videos.bulk_write([InsertOne(v) for v in videos], ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            logger.error(f"Video import: {len(failed)} of {len(videos)} inserts failed")
+            videos = [v for i, v in enumerate(videos) if i not in failed]
+        except Exception as e:
+            logger.error(f"Error importing videos: {e}")
+            return []
+        
+        return videos
+    
     async def get_video_by_code(self, short_code: str) -> Optional[Dict]:
-        """Get video by short code"""
+        """Get video by short code (cached, unknown codes cached briefly)"""
+        short_code = short_code.upper()
+        cached = self._video_cache.get(short_code)
+        if cached is _NOT_FOUND:
+            return None
+        if cached is not None:
+            return cached
+        
         try:
-            video = await self.videos.find_one({"short_code": short_code.upper()})
-            return video
+            video = await self.videos.find_one({"short_code": short_code})
         except Exception as e:
             logger.error(f"Error getting video: {e}")
             return None
+        
+        if video:
+            self._video_cache.set(short_code, video)
+        else:
+            self._video_cache.set(short_code, _NOT_FOUND, Config.VIDEO_NEGATIVE_TTL)
+        return video
+    
+    def video_cached(self, short_code: str) -> bool:
+        """True if get_video_by_code will answer without a query"""
+        return short_code.upper() in self._video_cache
+    
+    async def set_video_auto_delete(self, short_code: str, seconds: Optional[int]) -> bool:
+        """Override auto-delete for one video (None = global default, 0 = never)"""
+        short_code = short_code.upper()
+        if seconds is None:
+            update = {"$unset": {"auto_delete": ""}}
+        else:
+            update = {"$set": {"auto_delete": seconds}}
+        try:
+            result = await self.videos.update_one({"short_code": short_code}, update)
+            self._video_cache.pop(short_code)
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Error setting auto-delete: {e}")
+            return False
+    
+    async def get_videos_by_codes(self, short_codes: List[str]) -> Dict[str, Dict]:
+        """Get several videos by short code in one query"""
+        try:
+            codes = [c.upper() for c in short_codes]
+            videos = await self.videos.find({"short_code": {"$in": codes}}).to_list(length=len(codes))
+            return {v["short_code"]: v for v in videos}
+        except Exception as e:
+            logger.error(f"Error getting videos: {e}")
+            return {}
+    
+    async def add_series(self, short_code: str, title: str, items: List[Dict]) -> bool:
+        """Add a series code resolving to an ordered list of source messages
+        
+        Raises DuplicateKeyError if the code is already taken.
+        """
+        try:
+            await self.videos.insert_one({
+                "short_code": short_code,
+                "title": title,
+                "items": items,
+                "message_id": items[0]["message_id"],
+                "channel_id": items[0].get("channel_id"),
+                "added_date": datetime.now()
+            })
+            self._video_cache.pop(short_code.upper())
+            logger.info(f"✅ Series saved: {short_code} -> {len(items)} videos")
+            return True
+        except DuplicateKeyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error adding series: {e}")
+            return False
     
     async def video_exists(self, message_id: int = None, short_code: str = None) -> bool:
         """Check if video exists in database"""
@@ -177,34 +419,145 @@ class Database:
         except:
             return 0
     
-    async def get_next_video_number(self) -> int:
-        """Get next video number for auto-generation"""
-        try:
-            count = await self.videos.count_documents({})
-            return count + 1
-        except:
-            return 1
+    async def _seed_code_counter(self, prefix: str):
+        """Start a missing counter above the highest existing code for prefix"""
+        if prefix in self._seeded_prefixes:
+            return
+        
+        counter_id = f"short_code:{prefix}"
+        if not await self.counters.find_one({"_id": counter_id}):
+            highest = 0
+            pattern = re.compile(rf"^{re.escape(prefix)}(\d+)$")
+            cursor = self.videos.find(
+                {"short_code": {"$regex": pattern.pattern}},
+                {"short_code": 1, "_id": 0}
+            )
+            async for video in cursor:
+                highest = max(highest, int(pattern.match(video["short_code"]).group(1)))
+            
+            # $max keeps this safe if another process seeds at the same time
+            await self.counters.update_one(
+                {"_id": counter_id},
+                {"$max": {"seq": highest}},
+                upsert=True
+            )
+        self._seeded_prefixes.add(prefix)
+    
+    async def reserve_code_numbers(self, count: int, prefix: str = "VID") -> range:
+        """Atomically reserve count consecutive code numbers for prefix"""
+        await self._seed_code_counter(prefix)
+        counter = await self.counters.find_one_and_update(
+            {"_id": f"short_code:{prefix}"},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        last = counter["seq"]
+        return range(last - count + 1, last + 1)
     
     async def generate_short_code(self, prefix: str = "VID") -> str:
-        """Generate unique short code"""
+        """Generate unique short code from this process's reserved block
+        
+        Raises if no block can be reserved; guessing a code could collide.
+        """
+        async with self._code_lock:
+            block = self._code_blocks.get(prefix)
+            if not block or block[0] > block[1]:
+                numbers = await self.reserve_code_numbers(max(1, Config.SHORT_CODE_BLOCK_SIZE), prefix)
+                block = self._code_blocks[prefix] = [numbers.start, numbers.stop - 1]
+            number = block[0]
+            block[0] += 1
+        return format_short_code(prefix, number)
+    
+    # ===================== WATCH ANALYTICS =====================
+    
+    async def record_watch(self, video: Dict, user_id: int):
+        """Log a watch event and bump per-video/hour/day counters (write-behind)"""
         try:
-            number = await self.get_next_video_number()
-            return f"{prefix}{number:04d}"
-        except:
-            import random
-            return f"{prefix}{random.randint(1000, 9999)}"
+            now = datetime.now()
+            hour = now.replace(minute=0, second=0, microsecond=0)
+            day = now.strftime("%Y-%m-%d")
+            short_code = video["short_code"]
+            
+            await self.write_buffer.insert(self.watch_events, {
+                "short_code": short_code,
+                "user_id": user_id,
+                "hour": hour,
+                "ts": now
+            })
+            await self.write_buffer.update(
+                self.video_counters,
+                {"_id": short_code},
+                set={"title": video.get("title"), "last_watched": now},
+                inc={"total": 1},
+                upsert=True
+            )
+            await self.write_buffer.update(
+                self.video_hourly,
+                {"hour": hour, "short_code": short_code},
+                inc={"count": 1},
+                upsert=True
+            )
+            await self.write_buffer.update(
+                self.video_daily,
+                {"day": day, "short_code": short_code},
+                inc={"count": 1},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error recording watch: {e}")
+    
+    async def get_top_videos(self, limit: int = 10) -> Dict:
+        """Get today's and this hour's most watched videos from the counters"""
+        try:
+            now = datetime.now()
+            hour = now.replace(minute=0, second=0, microsecond=0)
+            
+            today = await self.video_daily.find(
+                {"day": now.strftime("%Y-%m-%d")}, {"_id": 0}
+            ).sort("count", -1).limit(limit).to_list(length=limit)
+            this_hour = await self.video_hourly.find(
+                {"hour": hour}, {"_id": 0}
+            ).sort("count", -1).limit(limit).to_list(length=limit)
+            
+            codes = list({v["short_code"] for v in today + this_hour})
+            totals = await self.video_counters.find(
+                {"_id": {"$in": codes}}
+            ).to_list(length=len(codes))
+            
+            return {
+                "today": today,
+                "this_hour": this_hour,
+                "videos": {t["_id"]: t for t in totals}
+            }
+        except Exception as e:
+            logger.error(f"Error getting top videos: {e}")
+            return {}
     
     # ===================== CHANNEL OPERATIONS =====================
     
-    async def get_all_channels(self) -> List[Dict]:
-        """Get all active channels"""
+    async def refresh_channels(self) -> bool:
+        """Reload active channels into the registry"""
         try:
             channels = await self.channels.find(
                 {"is_active": True}
             ).sort("position", 1).to_list(length=None)
-            return channels
-        except:
+        except Exception as e:
+            logger.error(f"Error loading channels: {e}")
+            return False
+        
+        self._channels = channels
+        return True
+    
+    def _invalidate_channels(self):
+        """Drop the registry so the next read reloads it"""
+        self._channels = None
+    
+    async def get_all_channels(self) -> List[Dict]:
+        """Get all active channels (served from the in-process registry)"""
+        if self._channels is None and not await self.refresh_channels():
             return []
+        return list(self._channels)
     
     async def add_channel(self, username: str, chat_id: int, name: str = None) -> bool:
         """Add new channel"""
@@ -220,6 +573,7 @@ class Database:
                 "is_active": True,
                 "added_date": datetime.now()
             })
+            self._invalidate_channels()
             return True
         except Exception as e:
             logger.error(f"Error adding channel: {e}")
@@ -232,6 +586,7 @@ class Database:
                 {"username": username},
                 {"$set": {"is_active": False}}
             )
+            self._invalidate_channels()
             return result.modified_count > 0
         except:
             return False
@@ -239,35 +594,89 @@ class Database:
     # ===================== MESSAGE TRACKING =====================
     
     async def save_user_messages(self, user_id: int, message_ids: List[int]):
-        """Save user's message IDs for cleanup"""
+        """Append message IDs for cleanup, keeping only the newest MAX_CLEANUP_MESSAGES"""
+        if not message_ids:
+            return
         try:
             await self.user_messages.update_one(
                 {"user_id": user_id},
                 {
-                    "$set": {
-                        "message_ids": message_ids,
-                        "updated_at": datetime.now()
-                    }
+                    "$push": {
+                        "message_ids": {
+                            "$each": message_ids,
+                            "$slice": -Config.MAX_CLEANUP_MESSAGES
+                        }
+                    },
+                    "$set": {"updated_at": datetime.now()}
                 },
                 upsert=True
             )
         except:
             pass
     
-    async def get_user_messages(self, user_id: int) -> List[int]:
-        """Get user's saved message IDs"""
+    async def take_user_messages(self, user_id: int) -> List[int]:
+        """Atomically fetch and clear user's saved message IDs"""
         try:
-            data = await self.user_messages.find_one({"user_id": user_id})
+            data = await self.user_messages.find_one_and_delete({"user_id": user_id})
             return data.get("message_ids", []) if data else []
         except:
             return []
     
-    async def clear_user_messages(self, user_id: int):
-        """Clear user's saved messages"""
+    # ===================== SCHEDULED DELETIONS =====================
+    
+    async def schedule_deletion(self, chat_id: int, message_ids: List[int], delay: float) -> bool:
+        """Queue messages to be deleted `delay` seconds from now"""
         try:
-            await self.user_messages.delete_one({"user_id": user_id})
-        except:
-            pass
+            await self.scheduled_deletes.insert_one({
+                "chat_id": chat_id,
+                "message_ids": message_ids,
+                "status": "pending",
+                "due_at": datetime.utcnow() + timedelta(seconds=delay),
+                "created_at": datetime.utcnow()
+            })
+            return True
+        except Exception as e:
+            logger.error(f"Error scheduling deletion: {e}")
+            return False
+    
+    async def claim_due_deletions(self, limit: int, lease: float) -> List[Dict]:
+        """Claim up to `limit` due entries
+        
+        Claimed entries get a token and their due_at pushed `lease` seconds
+        ahead, so another worker skips them and they come back by themselves
+        if this process dies before completing them.
+        """
+        now = datetime.utcnow()
+        due = {"status": "pending", "due_at": {"$lte": now}}
+        token = ObjectId()
+        try:
+            docs = await self.scheduled_deletes.find(due, {"_id": 1}).sort("due_at", 1).to_list(length=limit)
+            if not docs:
+                return []
+            ids = [d["_id"] for d in docs]
+            await self.scheduled_deletes.update_many(
+                {**due, "_id": {"$in": ids}},
+                {"$set": {"claim": token, "due_at": now + timedelta(seconds=lease)}}
+            )
+            # Look up by _id; entries another worker claimed first lack our token
+            return await self.scheduled_deletes.find(
+                {"_id": {"$in": ids}, "claim": token}
+            ).to_list(length=limit)
+        except Exception as e:
+            logger.error(f"Error claiming deletions: {e}")
+            return []
+    
+    async def complete_deletions(self, entry_ids: List) -> bool:
+        """Mark claimed entries done, the TTL index removes them later"""
+        try:
+            await self.scheduled_deletes.update_many(
+                {"_id": {"$in": entry_ids}},
+                {"$set": {"status": "done", "done_at": datetime.utcnow()}, "$unset": {"claim": ""}}
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error completing deletions: {e}")
+            return False
     
     # ===================== BAN OPERATIONS =====================
     
@@ -285,6 +694,9 @@ class Database:
                 },
                 upsert=True
             )
+            self._banned_ids.add(user_id)
+            if self._ban_changes is not None:
+                self._ban_changes[user_id] = True
             return True
         except:
             return False
@@ -293,17 +705,40 @@ class Database:
         """Unban a user"""
         try:
             result = await self.banned_users.delete_one({"user_id": user_id})
+            self._banned_ids.discard(user_id)
+            if self._ban_changes is not None:
+                self._ban_changes[user_id] = False
             return result.deleted_count > 0
         except:
             return False
     
-    async def is_user_banned(self, user_id: int) -> bool:
-        """Check if user is banned"""
+    async def refresh_banned_users(self) -> bool:
+        """Reconcile the in-process ban set with the database
+        
+        Bans and unbans made while the query runs are replayed on top of
+        its result, so a slow refresh cannot undo them.
+        """
+        self._ban_changes = {}
         try:
-            banned = await self.banned_users.find_one({"user_id": user_id})
-            return banned is not None
-        except:
+            docs = await self.banned_users.find({}, {"user_id": 1, "_id": 0}).to_list(length=None)
+        except Exception as e:
+            logger.error(f"Error loading banned users: {e}")
             return False
+        finally:
+            changes, self._ban_changes = self._ban_changes, None
+        
+        banned_ids = {d["user_id"] for d in docs}
+        for user_id, banned in changes.items():
+            if banned:
+                banned_ids.add(user_id)
+            else:
+                banned_ids.discard(user_id)
+        self._banned_ids = banned_ids
+        return True
+    
+    async def is_user_banned(self, user_id: int) -> bool:
+        """Check if user is banned (in-memory, no network call)"""
+        return user_id in self._banned_ids
     
     async def get_banned_users(self) -> List[Dict]:
         """Get all banned users"""
@@ -312,19 +747,110 @@ class Database:
         except:
             return []
     
+    # ===================== BROADCAST JOBS =====================
+    
+    async def create_broadcast(self, text: str, admin_chat_id: int, total: int, owner, lease: float) -> Optional[Dict]:
+        """Create a persistent broadcast job, already claimed by `owner`"""
+        job = {
+            "text": text,
+            "admin_chat_id": admin_chat_id,
+            "status_message_id": None,
+            "status": "running",
+            "owner": owner,
+            "lease_until": datetime.utcnow() + timedelta(seconds=lease),
+            "cursor": None,
+            "total": total,
+            "sent": 0,
+            "blocked": 0,
+            "failed": 0,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now()
+        }
+        try:
+            result = await self.broadcasts.insert_one(job)
+            job["_id"] = result.inserted_id
+            return job
+        except Exception as e:
+            logger.error(f"Error creating broadcast: {e}")
+            return None
+    
+    async def update_broadcast(self, job_id, fields: Dict = None, counts: Dict = None, owner=None) -> bool:
+        """Persist broadcast progress (cursor/status fields and counter increments)
+        
+        With `owner` the update only applies to a running job still claimed
+        by it; False then means the job was cancelled or taken over.
+        """
+        query = {"_id": job_id}
+        if owner is not None:
+            query.update({"owner": owner, "status": "running"})
+        update = {"$set": {**(fields or {}), "updated_at": datetime.now()}}
+        if counts:
+            update["$inc"] = counts
+        try:
+            result = await self.broadcasts.update_one(query, update)
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Error updating broadcast: {e}")
+            # Unknown outcome, the lease decides who carries on
+            return True
+    
+    async def claim_broadcast(self, owner, lease: float) -> Optional[Dict]:
+        """Claim one running job whose lease expired or was released
+        
+        The claim holds for `lease` seconds and is renewed by every progress
+        update, so only one process sends a job at a time and a job left by
+        a dead process is picked up once its lease runs out.
+        """
+        now = datetime.utcnow()
+        try:
+            return await self.broadcasts.find_one_and_update(
+                {"status": "running", "lease_until": {"$not": {"$gt": now}}},
+                {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=lease)}},
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.error(f"Error claiming broadcast: {e}")
+            return None
+    
     # ===================== STATISTICS =====================
     
-    async def get_stats(self) -> Dict:
-        """Get bot statistics"""
+    async def refresh_stats(self) -> bool:
+        """Rebuild the stats snapshot with concurrent, index-backed queries"""
         try:
-            return {
-                "total_users": await self.get_total_users(),
-                "total_videos": await self.get_total_videos(),
-                "total_channels": len(await self.get_all_channels()),
-                "banned_users": len(await self.get_banned_users())
-            }
-        except:
+            day_ago = datetime.now() - timedelta(days=1)
+            total_users, total_videos, daily_active = await asyncio.gather(
+                self.users.estimated_document_count(),
+                self.videos.estimated_document_count(),
+                self.users.count_documents({"last_active": {"$gte": day_ago}})
+            )
+        except Exception as e:
+            logger.error(f"Error refreshing stats: {e}")
+            return False
+        
+        self._stats = {
+            "total_users": total_users,
+            "total_videos": total_videos,
+            "daily_active_users": daily_active,
+            "total_channels": len(self._channels or []),
+            "banned_users": len(self._banned_ids)
+        }
+        self._stats_at = datetime.now()
+        return True
+    
+    async def get_stats(self) -> Dict:
+        """Get bot statistics from the background snapshot
+        
+        Counts are estimates; "snapshot_age" is the snapshot's age in seconds.
+        """
+        if self._stats_at is None:
+            await self.refresh_stats()
+        if self._stats_at is None:
             return {}
+        
+        return {
+            **self._stats,
+            "snapshot_age": (datetime.now() - self._stats_at).total_seconds()
+        }
 
 # Create global database instance
 db = Database()
@@ -0,0 +1,107 @@
+"""
+CINEFLIX Outbound Telegram Governor
+Single scheduler for every Bot API call: global and per-chat token buckets,
+priorities and automatic RetryAfter backoff
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from cache import TTLCache
+from config import Config
+from metrics import BOT_API_LATENCY, BOT_API_RETRIES
+from ratelimit import PriorityTokenBucket, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Pass as rate_limit_args for bulk traffic (broadcasts, cleanup)
+LOW_PRIORITY = {"priority": "low"}
+
+# Bulk traffic into a scratch chat whose copies are deleted right away
+# (backfill inspection): no per-chat pacing, flood waits still pause it
+SCRATCH = {"priority": "low", "per_chat": False}
+
+# Endpoints that post or change messages count against Telegram's flood limits
+THROTTLED_PREFIXES = ("send", "copy", "forward", "edit")
+
+
+class TelegramGovernor(BaseRateLimiter):
+    """Rate limiter installed on the Application so all bot calls pass through it"""
+
+    def __init__(self):
+        self.global_bucket = PriorityTokenBucket(
+            Config.GOVERNOR_GLOBAL_RATE,
+            reserve=Config.GOVERNOR_LOW_PRIORITY_RESERVE
+        )
+        self._chat_buckets = TTLCache(Config.GOVERNOR_MAX_CHATS, 60)
+        self.retries = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(Config.GOVERNOR_PRIVATE_CHAT_RATE, Config.GOVERNOR_CHAT_BURST)
+            else:
+                bucket = TokenBucket(Config.GOVERNOR_GROUP_CHAT_RATE, Config.GOVERNOR_CHAT_BURST)
+        # Re-set on every use to keep active chats from expiring
+        self._chat_buckets.set(chat_id, bucket)
+        return bucket
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict],
+    ) -> Any:
+        low_priority = bool(rate_limit_args) and rate_limit_args.get("priority") == "low"
+        per_chat = endpoint.startswith(THROTTLED_PREFIXES) and (rate_limit_args or {}).get("per_chat", True)
+        # Low-priority traffic (bulk deletes included) always takes a global
+        # token so it yields to user-facing calls
+        throttled = per_chat or low_priority
+        chat_id = data.get("chat_id")
+
+        started = time.perf_counter()
+        try:
+            return await self._send(callback, args, kwargs, endpoint, chat_id, throttled, per_chat, low_priority)
+        finally:
+            BOT_API_LATENCY.observe(time.perf_counter() - started, method=endpoint)
+
+    async def _send(self, callback, args, kwargs, endpoint, chat_id, throttled, per_chat, low_priority):
+        for attempt in range(Config.GOVERNOR_MAX_RETRIES + 1):
+            if throttled:
+                if per_chat and chat_id is not None:
+                    await self._chat_bucket(chat_id).acquire()
+                await self.global_bucket.acquire(low_priority=low_priority)
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == Config.GOVERNOR_MAX_RETRIES:
+                    raise
+                self.retries += 1
+                BOT_API_RETRIES.inc(method=endpoint)
+                retry_after = float(e.retry_after)
+                logger.warning(f"{endpoint} hit flood control, retrying in {retry_after}s")
+                if low_priority:
+                    # A flood wait during bulk sending applies to the whole bot,
+                    # so hold back every bulk sender, not just this chat
+                    self.global_bucket.pause_low_priority(retry_after)
+                elif chat_id is not None:
+                    self._chat_bucket(chat_id).pause(retry_after)
+                else:
+                    self.global_bucket.pause(retry_after)
+                await asyncio.sleep(retry_after)
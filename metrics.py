@@ -0,0 +1,283 @@
+"""
+CINEFLIX Metrics
+In-process counters, gauges and latency histograms served in the
+Prometheus text format
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers cache hits up to slow flood-controlled sends
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._collectors: List[Callable[[], Iterable[Tuple[Dict, float]]]] = []
+        registry.append(self)
+
+    def collect_from(self, func: Callable[[], Iterable[Tuple[Dict, float]]]):
+        """Read (labels, value) pairs from func on every scrape
+
+        Used for numbers other components already track, so they are not
+        counted twice.
+        """
+        self._collectors.append(func)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        for func in self._collectors:
+            try:
+                for labels, value in func():
+                    lines.append(f"{self.name}{_format_labels(_labels(labels))} {value}")
+            except Exception as e:
+                logger.debug(f"Metric collector for {self.name} failed: {e}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Point-in-time value, usually read through collect_from"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[_labels(labels)] = value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., sum, count]
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, series in self._values.items():
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', str(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {round(series[-2], 6)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+registry: List[_Metric] = []
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def timed(histogram: Histogram, label: str = "name"):
+    """Decorator observing how long a coroutine function takes"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **{label: func.__name__})
+        return wrapper
+    return decorator
+
+
+def timed_methods(histogram: Histogram, label: str = "method"):
+    """Class decorator timing every public coroutine method"""
+    def decorator(cls):
+        for name, member in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.iscoroutinefunction(member):
+                setattr(cls, name, timed(histogram, label)(member))
+        return cls
+    return decorator
+
+
+# ===================== METRICS =====================
+
+HANDLER_LATENCY = Histogram("cineflix_handler_seconds", "Time spent in bot handlers")
+DB_LATENCY = Histogram("cineflix_db_seconds", "Time spent in Database methods")
+BOT_API_LATENCY = Histogram(
+    "cineflix_bot_api_seconds", "Bot API call latency including rate limiter waits"
+)
+
+CACHE_HITS = Counter("cineflix_cache_hits_total", "In-process cache hits")
+CACHE_MISSES = Counter("cineflix_cache_misses_total", "In-process cache misses")
+SPAM_REJECTIONS = Counter("cineflix_spam_rejections_total", "Requests dropped by anti-spam")
+FORCE_JOIN_BLOCKS = Counter(
+    "cineflix_force_join_blocks_total", "Video requests blocked until channels are joined"
+)
+COPY_FAILURES = Counter("cineflix_copy_failures_total", "Failed copy_message(s) calls")
+BOT_API_RETRIES = Counter("cineflix_bot_api_retries_total", "Bot API calls retried after flood control")
+
+QUEUE_DEPTH = Gauge("cineflix_queue_depth", "Items waiting in internal queues")
+
+SPAM_LIMITER_EVENTS = Counter(
+    "cineflix_spam_limiter_events_total", "Local anti-spam limiter decisions and key removals"
+)
+SPAM_LIMITER_KEYS = Gauge("cineflix_spam_limiter_keys", "Users tracked by the local anti-spam limiter")
+SPAM_LIMITER_FALLBACKS = Counter(
+    "cineflix_spam_limiter_fallbacks_total", "Shared limiter checks answered by the local fallback"
+)
+
+WRITE_BEHIND_FLUSHES = Counter("cineflix_write_behind_flushes_total", "Write-behind flushes")
+WRITE_BEHIND_OPS = Counter("cineflix_write_behind_ops_total", "Buffered operations written, by result")
+WRITE_BEHIND_LAG = Gauge(
+    "cineflix_write_behind_lag_seconds", "Age of the oldest buffered write when it was flushed"
+)
+
+
+def track_cache(name: str, cache):
+    """Export a TTLCache's hit/miss counters"""
+    CACHE_HITS.collect_from(lambda: [({"cache": name}, cache.hits)])
+    CACHE_MISSES.collect_from(lambda: [({"cache": name}, cache.misses)])
+
+
+def track_spam_limiter(limiter, backend=None):
+    """Export a SpamLimiter's hit/eviction counters (and a shared backend's fallbacks)"""
+    SPAM_LIMITER_EVENTS.collect_from(lambda: [
+        ({"event": "allowed"}, limiter.allowed),
+        ({"event": "limited"}, limiter.limited),
+        ({"event": "expired"}, limiter.expired),
+        ({"event": "evicted"}, limiter.evicted)
+    ])
+    SPAM_LIMITER_KEYS.collect_from(lambda: [({}, len(limiter))])
+    if backend is not None and hasattr(backend, "fallbacks"):
+        SPAM_LIMITER_FALLBACKS.collect_from(lambda: [({}, backend.fallbacks)])
+
+
+def track_write_buffer(buffer):
+    """Export a WriteBehindBuffer's flush counters and lag"""
+    WRITE_BEHIND_FLUSHES.collect_from(lambda: [({}, buffer.flushes)])
+    WRITE_BEHIND_OPS.collect_from(lambda: [
+        ({"result": "flushed"}, buffer.flushed_ops),
+        ({"result": "failed"}, buffer.failed_ops)
+    ])
+    WRITE_BEHIND_LAG.collect_from(lambda: [
+        ({"flush": "last"}, buffer.last_flush_lag),
+        ({"flush": "max"}, buffer.max_flush_lag)
+    ])
+
+
+def track_queue(name: str, size: Callable[[], int]):
+    """Export the current length of a queue"""
+    QUEUE_DEPTH.collect_from(lambda: [({"queue": name}, size())])
+
+
+# ===================== HTTP ENDPOINT =====================
+
+class MetricsServer:
+    """Tiny HTTP server answering GET /metrics"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self):
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            logger.info(f"📈 Metrics on http://{self.host}:{self.port}/metrics")
+        except OSError as e:
+            logger.error(f"Could not start metrics server: {e}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode(errors="replace").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
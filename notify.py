@@ -0,0 +1,132 @@
+"""
+CINEFLIX Admin Upload Notifications
+Sends the first upload right away and folds bulk uploads into digests
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from telegram.error import BadRequest
+from telegram.helpers import escape_markdown
+
+from config import Config
+from governor import LOW_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+
+def format_upload(video: Dict, bot_username: str) -> str:
+    """Full notification for a single new video"""
+    short_code = video["short_code"]
+    deep_link = f"https://t.me/{bot_username}?start={short_code}"
+
+    return f"""📹 **New Video Added!**
+
+📌 **Title:** {escape_markdown(video['title'])}
+
+🔐 **Short Code:** `{short_code}`
+
+🆔 **Message ID:** `{video['message_id']}`
+
+📢 **Channel:** {escape_markdown(video['channel'])}
+
+🔗 **Deep Link:**
+`{deep_link}`
+
+✅ Video saved! Use the short code in your mini app.
+Users will click and watch directly!
+
+**Mini App Link Format:**
+`t.me/{bot_username}?start={short_code}`"""
+
+
+def format_digest(videos: List[Dict], bot_username: str) -> str:
+    """One compact message listing several new videos"""
+    lines = [f"📹 **{len(videos)} New Videos Added!**", ""]
+    for video in videos:
+        lines.append(f"• `{video['short_code']}` - {escape_markdown(video['title'])}")
+        lines.append(f"  `t.me/{bot_username}?start={video['short_code']}`")
+    return "\n".join(lines)
+
+
+class UploadNotifier:
+    """Coalesces new-video notifications to the admin
+
+    The first upload after a quiet period is sent immediately. Uploads
+    arriving within `window` seconds of the last send are collected and
+    sent as digests of at most `max_items` videos, so a season upload costs
+    a handful of messages instead of one per file.
+    """
+
+    def __init__(self, window: float, max_items: int):
+        self.window = window
+        self.max_items = max_items
+        self._pending: List[Dict] = []
+        self._task: Optional[asyncio.Task] = None
+        self.bot = None
+
+    async def add(self, bot, video: Dict):
+        """Report a new video: {short_code, title, message_id, channel}"""
+        self.bot = bot
+        if self._task:
+            self._pending.append(video)
+            return
+
+        self._task = asyncio.create_task(self._run())
+        await self._send(format_upload(video, bot.username))
+
+    async def stop(self):
+        """Send whatever is still collected"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Send collected videos as digests, returns how many were sent"""
+        videos, self._pending = self._pending, []
+        for i in range(0, len(videos), self.max_items):
+            chunk = videos[i:i + self.max_items]
+            if len(chunk) == 1:
+                await self._send(format_upload(chunk[0], self.bot.username))
+            else:
+                await self._send(format_digest(chunk, self.bot.username))
+        return len(videos)
+
+    async def _run(self):
+        try:
+            # Keep collecting while uploads keep coming
+            while True:
+                await asyncio.sleep(self.window)
+                if not await self.flush():
+                    break
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    async def _send(self, text: str):
+        try:
+            try:
+                await self.bot.send_message(
+                    chat_id=Config.ADMIN_ID,
+                    text=text,
+                    parse_mode='Markdown',
+                    rate_limit_args=LOW_PRIORITY
+                )
+            except BadRequest as e:
+                if "parse" not in str(e).lower():
+                    raise
+                # Never lose a digest to a formatting problem
+                await self.bot.send_message(
+                    chat_id=Config.ADMIN_ID,
+                    text=text,
+                    rate_limit_args=LOW_PRIORITY
+                )
+        except Exception as e:
+            logger.error(f"Failed to notify admin: {e}")
+
+
+# Create global upload notifier
+upload_notifier = UploadNotifier(Config.UPLOAD_NOTIFY_WINDOW, Config.UPLOAD_DIGEST_MAX_ITEMS)
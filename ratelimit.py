@@ -0,0 +1,282 @@
+"""
+CINEFLIX Rate Limiting
+Token buckets for outbound Telegram traffic and per-user spam limits
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (e.g. after a RetryAfter)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, tokens: float = 1):
+        """Wait until `tokens` are available and take them"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class PriorityTokenBucket(TokenBucket):
+    """Token bucket where low-priority callers yield to high-priority ones
+
+    Low-priority acquirers wait while any high-priority acquirer is waiting
+    and never take the last `reserve` tokens, so bulk traffic can't starve
+    user-facing requests. `pause_low_priority` holds back only bulk traffic.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, reserve: float = 0):
+        super().__init__(rate, capacity)
+        self.reserve = min(reserve, self.capacity - 1)
+        self._high_waiting = 0
+        self._low_paused_until = 0.0
+
+    def pause_low_priority(self, seconds: float):
+        """Stop handing tokens to low-priority callers for `seconds`"""
+        self._low_paused_until = max(self._low_paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, tokens: float = 1, low_priority: bool = False):
+        if not low_priority:
+            self._high_waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                paused_until = self._paused_until
+                if low_priority:
+                    paused_until = max(paused_until, self._low_paused_until)
+                if now < paused_until:
+                    await asyncio.sleep(paused_until - now)
+                    continue
+
+                self._refill(now)
+                needed = tokens + (self.reserve if low_priority else 0)
+                blocked = low_priority and self._high_waiting > 0
+                if not blocked and self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+
+                await asyncio.sleep(max((needed - self._tokens) / self.rate, 0.01))
+        finally:
+            if not low_priority:
+                self._high_waiting -= 1
+
+
+def _now_ms() -> int:
+    return time.monotonic_ns() // 1_000_000
+
+
+class SpamLimiter:
+    """Per-key request limiter with bounded, self-expiring state
+
+    Policies:
+      - "cooldown": one request per `cooldown` seconds
+      - "sliding_window": `max_requests` per `window` seconds (weighted
+        two-window approximation, three ints per key)
+      - "token_bucket": bursts of `max_requests`, refilled over `window`
+
+    State is kept as small int tuples in an OrderedDict ordered by last
+    update. Every policy has a fixed TTL, so expired keys are always at the
+    front and get swept on each call; `max_keys` caps memory on top of that.
+    """
+
+    POLICIES = ("cooldown", "sliding_window", "token_bucket")
+
+    def __init__(self, policy: str = "cooldown", cooldown: float = 5, max_requests: int = 3,
+                 window: float = 15, max_keys: int = 100000):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown spam policy: {policy}")
+
+        self.policy = policy
+        self.cooldown_ms = int(cooldown * 1000)
+        self.max_requests = max_requests
+        self.window_ms = int(window * 1000)
+        self.max_keys = max_keys
+        self._state: "OrderedDict[int, tuple]" = OrderedDict()
+
+        if policy == "cooldown":
+            self._ttl_ms = self.cooldown_ms
+        elif policy == "sliding_window":
+            self._ttl_ms = 2 * self.window_ms
+        else:
+            self._ttl_ms = self.window_ms
+
+        # Metrics
+        self.allowed = 0
+        self.limited = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def _sweep(self, now: int):
+        state = self._state
+        while state:
+            key, (expires_at, _) = next(iter(state.items()))
+            if expires_at > now:
+                break
+            state.popitem(last=False)
+            self.expired += 1
+
+    def _store(self, key, now: int, value: tuple):
+        self._state[key] = (now + self._ttl_ms, value)
+        self._state.move_to_end(key)
+        while len(self._state) > self.max_keys:
+            self._state.popitem(last=False)
+            self.evicted += 1
+
+    def hit(self, key) -> bool:
+        """Record a request for key; returns True if it should be rejected"""
+        now = _now_ms()
+        self._sweep(now)
+        entry = self._state.get(key)
+        value = entry[1] if entry else None
+
+        if self.policy == "cooldown":
+            limited = value is not None and now - value[0] < self.cooldown_ms
+            new_value = None if limited else (now,)
+        elif self.policy == "sliding_window":
+            limited, new_value = self._sliding_window(now, value)
+        else:
+            limited, new_value = self._token_bucket(now, value)
+
+        if new_value is not None:
+            self._store(key, now, new_value)
+
+        if limited:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return limited
+
+    def _sliding_window(self, now: int, value: Optional[tuple]):
+        window_start = now - now % self.window_ms
+        if value is None:
+            previous, current = 0, 0
+        elif value[0] == window_start:
+            previous, current = value[1], value[2]
+        elif value[0] == window_start - self.window_ms:
+            previous, current = value[2], 0
+        else:
+            previous, current = 0, 0
+
+        weight = 1 - (now - window_start) / self.window_ms
+        if previous * weight + current >= self.max_requests:
+            return True, None
+        return False, (window_start, previous, current + 1)
+
+    def _token_bucket(self, now: int, value: Optional[tuple]):
+        # Tokens are stored in thousandths to stay integral
+        capacity = self.max_requests * 1000
+        if value is None:
+            tokens = capacity
+        else:
+            tokens = min(capacity, value[0] + (now - value[1]) * capacity // self.window_ms)
+
+        if tokens < 1000:
+            return True, None
+        return False, (tokens - 1000, now)
+
+
+class LimiterBackend:
+    """Where spam-limit state lives; hit() returns True if the key is limited"""
+
+    async def hit(self, key) -> bool:
+        raise NotImplementedError
+
+
+class LocalLimiterBackend(LimiterBackend):
+    """In-process backend (per replica)"""
+
+    def __init__(self, limiter: SpamLimiter):
+        self.limiter = limiter
+
+    async def hit(self, key) -> bool:
+        return self.limiter.hit(key)
+
+
+class MongoLimiterBackend(LimiterBackend):
+    """Backend shared by every replica through a TTL-indexed Mongo collection
+
+    Each check is a single find_one_and_update. The cooldown policy uses a
+    conditional upsert (a duplicate key means the user is still cooling
+    down); the window policies use a fixed-window counter. If Mongo errors
+    or takes longer than `timeout`, the local fallback answers instead. The
+    fallback sees every request so its state is warm when it is needed.
+    """
+
+    def __init__(self, get_collection: Callable, fallback: LocalLimiterBackend, timeout: float):
+        self._get_collection = get_collection
+        self.fallback = fallback
+        self.timeout = timeout
+        self.fallbacks = 0
+
+    async def hit(self, key) -> bool:
+        local_limited = await self.fallback.hit(key)
+        try:
+            return await asyncio.wait_for(self._shared_hit(key), self.timeout)
+        except Exception:
+            self.fallbacks += 1
+            return local_limited
+
+    async def _shared_hit(self, key) -> bool:
+        collection = self._get_collection()
+        limiter = self.fallback.limiter
+        now = datetime.utcnow()
+
+        if limiter.policy == "cooldown":
+            until = now + timedelta(milliseconds=limiter.cooldown_ms)
+            try:
+                await collection.find_one_and_update(
+                    {"_id": f"spam:{key}", "until": {"$lte": now}},
+                    {"$set": {"until": until, "expires_at": until}},
+                    upsert=True
+                )
+                return False
+            except DuplicateKeyError:
+                return True
+
+        window = int(now.timestamp() * 1000) // limiter.window_ms
+        counter = await collection.find_one_and_update(
+            {"_id": f"spam:{key}:{window}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {"expires_at": now + timedelta(milliseconds=2 * limiter.window_ms)}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["count"] > limiter.max_requests
@@ -0,0 +1,70 @@
+"""
+CINEFLIX Update Processing
+Concurrent update processing that keeps each user's updates in order
+"""
+
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+# Slots for the base class; the real bound is our own semaphore
+_UNBOUNDED = 2 ** 31 - 1
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Runs updates from different users concurrently, one at a time per user
+
+    The concurrency limit is applied only after an update holds its user's
+    lock, so a user flooding updates waits on their own lock without taking
+    slots away from everyone else.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(_UNBOUNDED)
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._users: Dict[int, int] = {}
+
+    @staticmethod
+    def _key(update: object) -> Optional[int]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                async with self._slots:
+                    await coroutine
+        finally:
+            # Forget idle users so the lock table stays small
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+    @property
+    def pending(self) -> int:
+        """Updates being processed or waiting for their user's lock"""
+        return sum(self._users.values())
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,165 @@
+"""
+CINEFLIX Write-Behind Buffer
+Coalesces hot-path Mongo writes and flushes them with bulk_write
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import InsertOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingUpdate:
+    """One coalesced update for a single document"""
+
+    __slots__ = ("collection", "filter", "set", "set_on_insert", "inc", "upsert")
+
+    def __init__(self, collection, filter: Dict):
+        self.collection = collection
+        self.filter = filter
+        self.set: Dict = {}
+        self.set_on_insert: Dict = {}
+        self.inc: Dict = {}
+        self.upsert = False
+
+    def to_operation(self) -> UpdateOne:
+        update = {}
+        if self.set:
+            update["$set"] = self.set
+        if self.inc:
+            update["$inc"] = self.inc
+        # $inc creates missing fields itself; both on one path is a conflict
+        set_on_insert = {k: v for k, v in self.set_on_insert.items() if k not in self.inc}
+        if set_on_insert:
+            update["$setOnInsert"] = set_on_insert
+        return UpdateOne(self.filter, update, upsert=self.upsert)
+
+
+class WriteBehindBuffer:
+    """Buffers updates/inserts and writes them in bulk
+
+    Updates to the same document are merged: $set keeps the latest value,
+    $inc adds up. A flush runs every `interval` seconds or once `max_ops`
+    operations have been buffered. When `max_pending` documents are waiting
+    the caller flushes inline, which bounds memory and applies backpressure.
+    """
+
+    def __init__(self, interval: float, max_ops: int, max_pending: int):
+        self.interval = interval
+        self.max_ops = max_ops
+        self.max_pending = max_pending
+
+        self._updates: Dict[Tuple, _PendingUpdate] = {}
+        self._inserts: List[Tuple] = []
+        self._ops = 0
+        self._oldest: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.failed_ops = 0
+        self.last_flush_lag = 0.0
+        self.max_flush_lag = 0.0
+
+    @property
+    def pending(self) -> int:
+        return len(self._updates) + len(self._inserts)
+
+    def start(self):
+        """Start the periodic flusher"""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write everything still buffered"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def update(self, collection, filter: Dict, set: Dict = None, set_on_insert: Dict = None,
+                     inc: Dict = None, upsert: bool = False):
+        """Buffer an update, merging it with any pending update for the same document"""
+        key = (collection.name, tuple(sorted(filter.items())))
+        pending = self._updates.get(key)
+        if pending is None:
+            pending = self._updates[key] = _PendingUpdate(collection, filter)
+
+        if set:
+            pending.set.update(set)
+        if set_on_insert:
+            for field, value in set_on_insert.items():
+                pending.set_on_insert.setdefault(field, value)
+        if inc:
+            for field, amount in inc.items():
+                pending.inc[field] = pending.inc.get(field, 0) + amount
+        pending.upsert = pending.upsert or upsert
+
+        await self._added()
+
+    async def insert(self, collection, document: Dict):
+        """Buffer an insert"""
+        self._inserts.append((collection, document))
+        await self._added()
+
+    async def _added(self):
+        self._ops += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+
+        if self.pending >= self.max_pending:
+            await self.flush()
+        elif self._ops >= self.max_ops:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Write all buffered operations now"""
+        async with self._flush_lock:
+            if not self._updates and not self._inserts:
+                return
+
+            updates, self._updates = self._updates, {}
+            inserts, self._inserts = self._inserts, []
+            oldest, self._oldest = self._oldest, None
+            self._ops = 0
+
+            by_collection: Dict[str, Tuple] = {}
+            for pending in updates.values():
+                entry = by_collection.setdefault(pending.collection.name, (pending.collection, []))
+                entry[1].append(pending.to_operation())
+            for collection, document in inserts:
+                entry = by_collection.setdefault(collection.name, (collection, []))
+                entry[1].append(InsertOne(document))
+
+            for collection, operations in by_collection.values():
+                try:
+                    await collection.bulk_write(operations, ordered=False)
+                    self.flushed_ops += len(operations)
+                except Exception as e:
+                    self.failed_ops += len(operations)
+                    logger.error(f"Write-behind flush to {collection.name} failed: {e}")
+
+            self.flushes += 1
+            if oldest is not None:
+                self.last_flush_lag = time.monotonic() - oldest
+                self.max_flush_lag = max(self.max_flush_lag, self.last_flush_lag)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush error: {e}")